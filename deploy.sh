@@ -7,6 +7,7 @@ npm ci
 ./node_modules/.bin/parcel build bundles-src/index.js --dist-dir bundles --public-url="./"
 python manage.py collectstatic --no-input
 python manage.py migrate --no-input
+python manage.py createcachetable
 systemctl daemon-reload
 systemctl reload nginx
 systemctl stop star-burger
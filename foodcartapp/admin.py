@@ -1,3 +1,5 @@
+from functools import partial
+
 from django.contrib import admin
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
@@ -5,8 +7,12 @@ from django.templatetags.static import static
 from django.utils.html import format_html
 from django.utils.http import url_has_allowed_host_and_scheme
 from django import forms
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 
-from .helpers.restaurant_helpers import get_available_restaurants
+from .helpers.candidate_helpers import refresh_order_candidates
+from .helpers.dispatch_helpers import dispatch_orders
 from .models import Order, OrderItem, Product
 from .models import ProductCategory
 from .models import Restaurant
@@ -15,6 +21,11 @@ from locations.models import Location
 from star_burger.settings import ALLOWED_HOSTS
 
 
+def locate_after_commit(address):
+    """Geocode the address once the transaction commits, so that other processes see its lock."""
+    transaction.on_commit(partial(Location.locate_or_defer, address))
+
+
 class RestaurantMenuItemInline(admin.TabularInline):
     model = RestaurantMenuItem
     extra = 0
@@ -38,7 +49,7 @@ class RestaurantAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         if not change or 'address' in form.changed_data:
-            Location.create_location_by_address(form.cleaned_data['address'])
+            locate_after_commit(form.cleaned_data['address'])
         super().save_model(request, obj, form, change)
 
 
@@ -149,18 +160,20 @@ class OrderForm(forms.ModelForm):
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     form = OrderForm
-    readonly_fields = ['price', 'created_at']
+    readonly_fields = ['total_price', 'items_count', 'created_at']
     inlines = [OrderItemInline]
+    actions = ['dispatch_selected_orders']
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.with_price().select_related('processing_restaurant')
+        return qs.select_related('processing_restaurant')
 
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
-        product_ids = obj.items.values_list('product_id', flat=True)
-        restaurant_ids = list(map(lambda rest: rest.id, get_available_restaurants(product_ids)))
-        form.base_fields['processing_restaurant'].queryset = Restaurant.objects.filter(id__in=restaurant_ids)
+        if obj is not None:
+            form.base_fields['processing_restaurant'].queryset = Restaurant.objects.filter(
+                Q(candidate_orders__order=obj) | Q(pk=obj.processing_restaurant_id)
+            ).distinct()
         return form
 
     def save_model(self, request, obj, form, change):
@@ -168,10 +181,15 @@ class OrderAdmin(admin.ModelAdmin):
             obj.status = Order.COOKING_STATUS
 
         if not change or 'address' in form.changed_data:
-            Location.create_location_by_address(form.cleaned_data['address'])
+            locate_after_commit(form.cleaned_data['address'])
 
         super().save_model(request, obj, form, change)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.update_totals()
+        refresh_order_candidates(Order.objects.filter(pk=form.instance.pk))
+
     def response_change(self, request, obj):
         res = super().response_post_save_change(request, obj)
         if 'next' in request.GET and url_has_allowed_host_and_scheme(request.GET['next'], ALLOWED_HOSTS):
@@ -179,10 +197,11 @@ class OrderAdmin(admin.ModelAdmin):
         else:
             return res
 
-    @admin.display(description='Сумма')
-    def price(self, obj):
-        return obj.price
+    @admin.action(description='Назначить ближайшие рестораны')
+    def dispatch_selected_orders(self, request, queryset):
+        assignment = dispatch_orders(queryset, capacity=settings.RESTAURANT_ORDERS_CAPACITY)
+        self.message_user(request, f'Назначено ресторанов: {len(assignment)}')
 
     @admin.display(description='Рестораны')
     def available_restaurants(self, obj):
-        return get_available_restaurants(obj.items.values_list('product_ids', flat=True))
+        return ', '.join(candidate.restaurant.name for candidate in obj.candidate_restaurants.select_related('restaurant'))
@@ -0,0 +1,173 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+
+from foodcartapp.helpers.restaurant_helpers import query_restaurant_ids_by_products
+from foodcartapp.models import Order, OrderCandidateRestaurant, OrderItem, Restaurant, RestaurantMenuItem
+from locations.models import Location
+from locations.services.distance_cache import distance_cache
+
+
+def get_locations_by_addresses(addresses):
+    return (
+        Location.objects
+        .only('address_key', 'latitude', 'longitude')
+        .by_addresses(addresses)
+    )
+
+
+def is_deliverable(delivery_location, distance_between):
+    if delivery_location is None:
+        return True
+    return distance_between is not None and distance_between <= settings.DELIVERY_RADIUS_KM
+
+
+def with_product_ids(orders):
+    return orders.prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.only('id', 'order_id', 'product_id'))
+    )
+
+
+def get_product_ids(order):
+    return {order_item.product_id for order_item in order.items.all()}
+
+
+def refresh_order_candidates(orders):
+    """Recompute the candidates of the orders: restaurants able to cook them within `DELIVERY_RADIUS_KM`."""
+    orders = list(with_product_ids(orders))
+    if not orders:
+        return
+
+    delivery_locations_by_addresses = get_locations_by_addresses(map(lambda order: order.address, orders))
+    delivery_locations = [delivery_locations_by_addresses.get(order.address) for order in orders]
+
+    product_ids_by_orders = [get_product_ids(order) for order in orders]
+    restaurant_ids_by_products = query_restaurant_ids_by_products(set().union(*product_ids_by_orders))
+    restaurant_ids_by_orders = [
+        sorted(set.intersection(*(restaurant_ids_by_products[product_id] for product_id in product_ids)))
+        if product_ids else []
+        for product_ids in product_ids_by_orders
+    ]
+    restaurants_by_ids = Restaurant.objects.only('id', 'address').in_bulk(
+        set().union(*restaurant_ids_by_orders)
+    )
+    restaurant_addresses = {
+        restaurants_by_ids[restaurant_id].address
+        for restaurant_ids in restaurant_ids_by_orders
+        for restaurant_id in restaurant_ids
+    }
+    restaurant_locations_by_addresses = (
+        Location.objects
+        .near(
+            {(location.latitude, location.longitude) for location in delivery_locations if location is not None},
+            settings.DELIVERY_RADIUS_KM,
+        )
+        .only('address_key', 'latitude', 'longitude')
+        .by_addresses(restaurant_addresses)
+    )
+
+    candidates = []
+    location_pairs = []
+    for order, delivery_location, restaurant_ids in zip(orders, delivery_locations, restaurant_ids_by_orders):
+        for restaurant_id in restaurant_ids:
+            restaurant = restaurants_by_ids[restaurant_id]
+            candidates.append(OrderCandidateRestaurant(order=order, restaurant=restaurant))
+            location_pairs.append(
+                (restaurant_locations_by_addresses.get(restaurant.address), delivery_location)
+            )
+
+    distances = distance_cache.get_distances(location_pairs)
+    deliverable_candidates = []
+    for candidate, (_, delivery_location), distance_between in zip(candidates, location_pairs, distances):
+        if is_deliverable(delivery_location, distance_between):
+            candidate.distance = distance_between
+            deliverable_candidates.append(candidate)
+
+    OrderCandidateRestaurant.objects.filter(order__in=orders).delete()
+    OrderCandidateRestaurant.objects.bulk_create(deliverable_candidates)
+
+
+def refresh_unfinished_orders_candidates(orders=None, batch_size=1000):
+    if orders is None:
+        orders = Order.objects.all()
+    order_ids = list(orders.unfinished().order_by('id').values_list('id', flat=True))
+    for start in range(0, len(order_ids), batch_size):
+        refresh_order_candidates(Order.objects.filter(id__in=order_ids[start:start + batch_size]))
+    return len(order_ids)
+
+
+def refresh_restaurant_candidates(restaurant_id, orders):
+    """Recompute one restaurant's candidate rows for the unfinished orders."""
+    orders = list(with_product_ids(orders.unfinished()))
+    if not orders:
+        return
+
+    product_ids_by_orders = [get_product_ids(order) for order in orders]
+    available_product_ids = set(
+        RestaurantMenuItem.objects
+        .filter(
+            restaurant_id=restaurant_id,
+            availability=True,
+            product_id__in=set().union(*product_ids_by_orders),
+        )
+        .values_list('product_id', flat=True)
+    )
+    eligible_orders = [
+        order for order, product_ids in zip(orders, product_ids_by_orders)
+        if product_ids and product_ids <= available_product_ids
+    ]
+
+    OrderCandidateRestaurant.objects.filter(restaurant_id=restaurant_id, order__in=orders).delete()
+    restaurant = Restaurant.objects.filter(pk=restaurant_id).first()
+    if restaurant is None or not eligible_orders:
+        return
+
+    locations_by_addresses = get_locations_by_addresses(
+        [restaurant.address, *map(lambda order: order.address, eligible_orders)]
+    )
+    restaurant_location = locations_by_addresses.get(restaurant.address)
+    delivery_locations = [locations_by_addresses.get(order.address) for order in eligible_orders]
+    distances = distance_cache.get_distances(
+        [(restaurant_location, delivery_location) for delivery_location in delivery_locations]
+    )
+    OrderCandidateRestaurant.objects.bulk_create([
+        OrderCandidateRestaurant(order=order, restaurant=restaurant, distance=distance_between)
+        for order, delivery_location, distance_between in zip(eligible_orders, delivery_locations, distances)
+        if is_deliverable(delivery_location, distance_between)
+    ])
+
+
+def refresh_menu_item_candidates(restaurant_id, product_ids):
+    """Add or drop the restaurant for unfinished orders containing the products."""
+    refresh_restaurant_candidates(
+        restaurant_id,
+        Order.objects.filter(items__product_id__in=product_ids).distinct(),
+    )
+
+
+def refresh_moved_restaurant_candidates(restaurant_id, points):
+    """Recompute the candidates of a moved restaurant for its orders and the orders near the points."""
+    nearby_address_keys = Location.objects.near(points, settings.DELIVERY_RADIUS_KM).values('address_key')
+    refresh_restaurant_candidates(
+        restaurant_id,
+        Order.objects.filter(
+            Q(candidate_restaurants__restaurant_id=restaurant_id) | Q(address_key__in=nearby_address_keys)
+        ).distinct(),
+    )
+
+
+def refresh_located_addresses_candidates(address_keys, batch_size=500):
+    """Recompute the candidates at addresses whose locations were created in bulk, bypassing the signals."""
+    address_keys = sorted(set(address_keys))
+    for start in range(0, len(address_keys), batch_size):
+        keys_batch = address_keys[start:start + batch_size]
+        points_by_keys = defaultdict(list)
+        locations = Location.objects.filter(address_key__in=keys_batch)
+        for address_key, latitude, longitude in locations.values_list('address_key', 'latitude', 'longitude'):
+            points_by_keys[address_key].append((latitude, longitude))
+
+        restaurants = Restaurant.objects.filter(address_key__in=keys_batch).values_list('id', 'address_key')
+        for restaurant_id, address_key in restaurants:
+            refresh_moved_restaurant_candidates(restaurant_id, points_by_keys[address_key])
+        refresh_unfinished_orders_candidates(Order.objects.filter(address_key__in=keys_batch))
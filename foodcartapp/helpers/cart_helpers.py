@@ -0,0 +1,49 @@
+import hashlib
+
+from django.core.cache import cache
+
+from foodcartapp.helpers.catalog_helpers import CATALOG_TTL_SECONDS, get_catalog_version
+from foodcartapp.helpers.restaurant_helpers import query_available_restaurant_ids
+from foodcartapp.models import Product
+
+
+CART_KEY_TEMPLATE = 'catalog:{version}:cart:{products_digest}'
+
+
+def get_cart_products(product_ids):
+    """Prices of the products and whether a restaurant can cook them all, cached under the catalog version."""
+    product_ids = sorted(set(product_ids))
+    products_digest = hashlib.md5(','.join(map(str, product_ids)).encode()).hexdigest()
+    key = CART_KEY_TEMPLATE.format(version=get_catalog_version(), products_digest=products_digest)
+
+    cart_products = cache.get(key)
+    if cart_products is None:
+        prices = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'price'))
+        cart_products = {
+            'prices': prices,
+            'can_be_fulfilled': len(prices) == len(product_ids) and bool(query_available_restaurant_ids(product_ids)),
+        }
+        cache.set(key, cart_products, timeout=CATALOG_TTL_SECONDS)
+    return cart_products
+
+
+def get_cart_quote(products, cart_products):
+    """Line totals, the cart total and whether the cart can be fulfilled."""
+    prices = cart_products['prices']
+    lines = []
+    total = 0
+    for cart_line in products:
+        price = prices[cart_line['product']]
+        line_total = price * cart_line['quantity']
+        total += line_total
+        lines.append({
+            'product': cart_line['product'],
+            'quantity': cart_line['quantity'],
+            'price': str(price),
+            'total': str(line_total),
+        })
+    return {
+        'lines': lines,
+        'total': str(total),
+        'can_be_fulfilled': cart_products['can_be_fulfilled'],
+    }
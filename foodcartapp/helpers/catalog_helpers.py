@@ -0,0 +1,139 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from foodcartapp.helpers.snapshot_helpers import build_snapshot
+from foodcartapp.models import Product
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_KEY_TEMPLATE = 'catalog:{version}:products'
+CATALOG_TTL_SECONDS = 24 * 60 * 60
+
+PRODUCT_FIELDS = {
+    'id': ['id'],
+    'name': ['name'],
+    'price': ['price'],
+    'special_status': ['special_status'],
+    'description': ['description'],
+    'category': ['category_id', 'category__name'],
+    'image': ['image'],
+}
+
+
+def get_catalog_version():
+    """Token of the current catalog state, changed by `bump_catalog_version`."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, uuid4().hex, timeout=None)
+
+
+def serialize_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+        'image': product.image.url,
+        'restaurant': {
+            'id': product.id,
+            'name': product.name,
+        }
+    }
+
+
+def render_catalog():
+    products = Product.objects.select_related('category').available()
+    return build_snapshot([serialize_product(product) for product in products])
+
+
+class CatalogSnapshots:
+    """Snapshot of the latest catalog version kept in the process memory."""
+
+    def __init__(self):
+        self._latest = (None, None)
+
+    def get(self, version):
+        latest_version, snapshot = self._latest
+        if latest_version == version:
+            return snapshot
+
+        key = CATALOG_KEY_TEMPLATE.format(version=version)
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = render_catalog()
+            cache.set(key, snapshot, timeout=CATALOG_TTL_SECONDS)
+        self._latest = (version, snapshot)
+        return snapshot
+
+
+catalog_snapshots = CatalogSnapshots()
+
+
+def get_catalog(version):
+    """Catalog snapshot of the version: compact JSON and its compressed variants."""
+    return catalog_snapshots.get(version)
+
+
+def dump_product_values(product_values, fields):
+    dumped_product = {}
+    for field in fields:
+        if field == 'category':
+            dumped_product['category'] = {
+                'id': product_values['category_id'],
+                'name': product_values['category__name'],
+            } if product_values['category_id'] else None
+        elif field == 'image':
+            image = product_values['image']
+            dumped_product['image'] = Product._meta.get_field('image').storage.url(image) if image else None
+        else:
+            dumped_product[field] = product_values[field]
+    return dumped_product
+
+
+def query_catalog(category=None, restaurant=None, special_status=None, fields=None, limit=None, cursor=None):
+    """Page of available products as dicts with the requested fields, and the cursor of the next page."""
+    fields = fields or list(PRODUCT_FIELDS)
+    if restaurant is None:
+        products = Product.objects.available()
+    else:
+        products = Product.objects.filter(menu_items__restaurant_id=restaurant, menu_items__availability=True)
+    if category is not None:
+        products = products.filter(category_id=category)
+    if special_status is not None:
+        products = products.filter(special_status=special_status)
+    if cursor is not None:
+        products = products.filter(id__gt=cursor)
+
+    columns = {'id'}
+    for field in fields:
+        columns.update(PRODUCT_FIELDS[field])
+    products = products.order_by('id').values(*columns)
+
+    if limit is None:
+        return [dump_product_values(product_values, fields) for product_values in products], None
+
+    products = list(products[:limit + 1])
+    next_cursor = products[limit - 1]['id'] if len(products) > limit else None
+    return [dump_product_values(product_values, fields) for product_values in products[:limit]], next_cursor
+
+
+def get_products_values(product_ids, fields=None):
+    """Products with the ids as dicts with the requested fields, ordered by id."""
+    fields = fields or list(PRODUCT_FIELDS)
+    columns = {'id'}
+    for field in fields:
+        columns.update(PRODUCT_FIELDS[field])
+    products = Product.objects.filter(id__in=product_ids).order_by('id').values(*columns)
+    return [dump_product_values(product_values, fields) for product_values in products]
@@ -0,0 +1,81 @@
+import math
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from foodcartapp.models import Order, OrderCandidateRestaurant
+
+
+def assign_restaurants(candidates, capacities, default_capacity=None):
+    """Greedy min-distance assignment of orders to restaurants: `{order_id: restaurant_id}`.
+
+    `candidates` are `(order_id, restaurant_id, distance)`, `None` capacity is unlimited.
+    """
+    capacities = dict(capacities)
+    sorted_candidates = sorted(
+        candidates,
+        key=lambda candidate: (candidate[2] is None, candidate[2] or 0, candidate[0], candidate[1]),
+    )
+
+    assignment = {}
+    for order_id, restaurant_id, _ in sorted_candidates:
+        if order_id in assignment:
+            continue
+        capacity = capacities.get(restaurant_id, default_capacity)
+        if capacity is not None and capacity <= 0:
+            continue
+        assignment[order_id] = restaurant_id
+        if capacity is not None:
+            capacities[restaurant_id] = capacity - 1
+    return assignment
+
+
+def get_free_capacities(capacity):
+    busy_restaurants = (
+        Order.objects
+        .filter(status__in=[Order.COOKING_STATUS, Order.DELIVER_STATUS])
+        .values('processing_restaurant')
+        .annotate(orders_count=Count('id'))
+        .values_list('processing_restaurant', 'orders_count')
+    )
+    return {restaurant_id: capacity - orders_count for restaurant_id, orders_count in busy_restaurants}
+
+
+def dispatch_orders(orders=None, capacity=None, dry_run=False):
+    """Assign restaurants to all unprocessed orders in one batch, at most `capacity` active orders each."""
+    if orders is None:
+        orders = Order.objects.all()
+    orders = orders.filter(status=Order.PROCESS_STATUS, processing_restaurant__isnull=True)
+
+    with transaction.atomic():
+        order_ids = list(orders.select_for_update().values_list('id', flat=True))
+        candidates = OrderCandidateRestaurant.objects.filter(order_id__in=order_ids).values_list(
+            'order_id', 'restaurant_id', 'distance'
+        )
+        capacities = {} if capacity is None else get_free_capacities(capacity)
+        assignment = assign_restaurants(candidates, capacities, default_capacity=capacity)
+        if dry_run or not assignment:
+            return assignment
+
+        updated_at = timezone.now()
+        assigned_orders = [
+            Order(
+                id=order_id,
+                processing_restaurant_id=restaurant_id,
+                status=Order.COOKING_STATUS,
+                updated_at=updated_at,
+            )
+            for order_id, restaurant_id in assignment.items()
+        ]
+        Order.objects.bulk_update(
+            assigned_orders,
+            ['processing_restaurant', 'status', 'updated_at'],
+            batch_size=1000,
+        )
+    return assignment
+
+
+def get_total_distance(candidates, assignment):
+    distances = {(order_id, restaurant_id): distance for order_id, restaurant_id, distance in candidates}
+    return math.fsum(distances[pair] or 0 for pair in assignment.items())
@@ -0,0 +1,48 @@
+import hashlib
+from functools import wraps
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodcartapp.models import IdempotencyKey
+
+
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def idempotent(view):
+    """Replay the stored response to a request repeated with the same `Idempotency-Key`.
+
+    The view must run in a transaction, so that a failed request releases the key.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {'message': f'Ключ идемпотентности длиннее {IDEMPOTENCY_KEY_MAX_LENGTH} символов.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        record, created = IdempotencyKey.claim(key, fingerprint)
+        if not created:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {'message': 'Ключ идемпотентности уже использован с другим запросом.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if record.response_status is None:
+                return Response(
+                    {'message': 'Запрос с этим ключом идемпотентности ещё обрабатывается.'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return Response(record.response_body, status=record.response_status)
+
+        response = view(request, *args, **kwargs)
+        record.save_response(response)
+        return response
+
+    return wrapper
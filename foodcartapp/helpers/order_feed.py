@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from foodcartapp.models import Order
+
+
+# Older sent orders beyond the limit may be sent once more, which is harmless.
+FEED_CURSOR_SENT_IDS_LIMIT = 200
+# Cursor of a board rendered with no orders at all: every order is new to it.
+FEED_START_CURSOR = 'start'
+
+
+def encode_feed_cursor(order, sent_order_ids=()):
+    cursor = f'{order.updated_at.isoformat()}_{order.id}'
+    if sent_order_ids:
+        cursor += '_' + ','.join(map(str, sorted(sent_order_ids)))
+    return cursor
+
+
+def decode_feed_cursor(cursor):
+    if cursor == FEED_START_CURSOR:
+        return None
+    try:
+        updated_at, order_id, *sent_order_ids = cursor.split('_')
+        if sent_order_ids:
+            sent_order_ids = {int(sent_order_id) for sent_order_id in sent_order_ids[0].split(',')}
+        return datetime.fromisoformat(updated_at), int(order_id), set(sent_order_ids)
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def get_feed_cursor():
+    """Cursor of the latest change; orders changed shortly before it count as sent."""
+    last_changed_order = Order.objects.order_by('-updated_at', '-id').only('id', 'updated_at').first()
+    if last_changed_order is None:
+        return FEED_START_CURSOR
+    window_start = last_changed_order.updated_at - timedelta(seconds=settings.ORDER_FEED_OVERLAP_SECONDS)
+    sent_order_ids = (
+        Order.objects
+        .filter(updated_at__gte=window_start)
+        .order_by('-updated_at')
+        .values_list('id', flat=True)[:FEED_CURSOR_SENT_IDS_LIMIT]
+    )
+    return encode_feed_cursor(last_changed_order, sent_order_ids)
+
+
+def get_order_changes(orders, cursor, limit):
+    """Orders changed after the cursor, oldest first, with the cursor after each of them.
+
+    Changes within `ORDER_FEED_OVERLAP_SECONDS` before the cursor are rescanned to catch late commits.
+    """
+    decoded_cursor = decode_feed_cursor(cursor)
+    if decoded_cursor is None:
+        orders = list(orders.order_by('updated_at', 'id')[:limit])
+        return [(order, encode_feed_cursor(order)) for order in orders]
+
+    updated_at, order_id, sent_order_ids = decoded_cursor
+    overlap = timedelta(seconds=settings.ORDER_FEED_OVERLAP_SECONDS)
+    orders = list(
+        orders
+        .filter(updated_at__gte=updated_at - overlap)
+        .order_by('updated_at', 'id')[:limit + len(sent_order_ids)]
+    )
+
+    cursor_order = Order(id=order_id, updated_at=updated_at)
+    sent_orders = {
+        order.id: order.updated_at for order in orders
+        if order.id in sent_order_ids and (order.updated_at, order.id) <= (updated_at, order_id)
+    }
+    changes = []
+    for order in orders:
+        if order.id in sent_orders:
+            continue
+        if (order.updated_at, order.id) > (cursor_order.updated_at, cursor_order.id):
+            cursor_order = order
+        sent_orders[order.id] = order.updated_at
+
+        window_start = cursor_order.updated_at - overlap
+        recently_sent_orders = sorted(
+            (sent_at, sent_order_id) for sent_order_id, sent_at in sent_orders.items() if sent_at >= window_start
+        )
+        changes.append((order, encode_feed_cursor(cursor_order, [
+            sent_order_id for _, sent_order_id in recently_sent_orders[-FEED_CURSOR_SENT_IDS_LIMIT:]
+        ])))
+        if len(changes) == limit:
+            break
+    return changes
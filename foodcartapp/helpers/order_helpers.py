@@ -1,46 +1,97 @@
-from foodcartapp.helpers.restaurant_helpers import get_available_restaurants
-from foodcartapp.models import Order, RestaurantMenuItem
-from locations.models import Location
+from collections import namedtuple
+from datetime import datetime
 
-from geopy import distance
+from django.db.models import F, Prefetch, Q
 
+from foodcartapp.models import Order, OrderCandidateRestaurant
+from locations.models import GeocodingJob
 
-def get_orders_with_available_restaurants():
-    orders = Order.objects.with_price().select_related('processing_restaurant').order_by('status')
-    menu_items = RestaurantMenuItem.objects.filter(availability=True).select_related('restaurant')
+
+OrdersPage = namedtuple('OrdersPage', ['orders', 'next_cursor', 'previous_cursor'])
+
+ORDERS_KEYSET = ('status', 'created_at', 'id')
+
+
+def encode_order_cursor(order):
+    return f'{order.status}_{order.created_at.isoformat()}_{order.id}'
+
+
+def decode_order_cursor(cursor):
+    try:
+        status, created_at, order_id = cursor.split('_')
+        return int(status), datetime.fromisoformat(created_at), int(order_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_keyset_filter(cursor, lookup):
+    status, created_at, order_id = cursor
+    return Q(**{f'status__{lookup}e': status}) & (
+        Q(**{f'status__{lookup}': status})
+        | Q(status=status, **{f'created_at__{lookup}': created_at})
+        | Q(status=status, created_at=created_at, **{f'id__{lookup}': order_id})
+    )
+
+
+def paginate_orders(orders, page_size, after=None, before=None):
+    """Keyset pagination of orders by `(status, created_at, id)` with `after` and `before` cursors."""
+    after, before = decode_order_cursor(after), decode_order_cursor(before)
+    if before is not None:
+        orders = orders.filter(get_keyset_filter(before, 'lt')).order_by(*(f'-{field}' for field in ORDERS_KEYSET))
+    else:
+        if after is not None:
+            orders = orders.filter(get_keyset_filter(after, 'gt'))
+        orders = orders.order_by(*ORDERS_KEYSET)
+
+    orders = list(orders[:page_size + 1])
+    has_more = len(orders) > page_size
+    orders = orders[:page_size]
+    if before is not None:
+        orders.reverse()
+
+    if not orders:
+        return OrdersPage(orders, None, None)
+
+    has_next = has_more if before is None else True
+    has_previous = has_more if before is not None else after is not None
+    return OrdersPage(
+        orders,
+        encode_order_cursor(orders[-1]) if has_next else None,
+        encode_order_cursor(orders[0]) if has_previous else None,
+    )
+
+
+def get_order_board_queryset():
+    candidate_restaurants = (
+        OrderCandidateRestaurant.objects
+        .select_related('restaurant')
+        .order_by(F('distance').asc(nulls_last=True), 'restaurant_id')
+    )
+    return (
+        Order.objects
+        .select_related('processing_restaurant')
+        .prefetch_related(Prefetch('candidate_restaurants', queryset=candidate_restaurants))
+    )
+
+
+def get_orders_with_available_restaurants(orders=None):
+    if orders is None:
+        orders = get_order_board_queryset().unfinished().order_by(*ORDERS_KEYSET)
+    orders = list(orders)
+
+    pending_addresses = set(
+        GeocodingJob.objects
+        .filter(status=GeocodingJob.PENDING_STATUS, address__in={order.address for order in orders})
+        .values_list('address', flat=True)
+    )
 
     orders_with_restaurants_and_locations = []
     for order in orders:
-        restaurants = get_available_restaurants(
-            order.items.values_list('product_id', flat=True),
-            menu_items=menu_items,
-        )
-        restaurant_addresses = list(map(lambda rest: rest.address, restaurants))
-        locations_by_addresses = Location.objects.in_bulk(
-            {order.address, *restaurant_addresses},
-            field_name='address',
-        )
-        delivery_location = locations_by_addresses.get(order.address)
-
-        restaurants_and_distances = []
-
-        for restaurant in restaurants:
-            restaurant_location = locations_by_addresses.get(restaurant.address)
-            if restaurant_location is None or delivery_location is None:
-                distance_between = None
-            else:
-                distance_between = distance.distance(
-                    (restaurant_location.latitude, restaurant_location.longitude),
-                    (delivery_location.latitude, delivery_location.longitude),
-                ).km
-                distance_between = round(distance_between, 1)
-
-            restaurants_and_distances.append([restaurant, distance_between])
-
-        sorted_restaurants_and_distances = sorted(
-            restaurants_and_distances,
-            key=lambda restaurant_and_distance: (restaurant_and_distance[1] is None, restaurant_and_distance[1]),
-        )
+        order.coordinates_pending = order.address in pending_addresses
+        sorted_restaurants_and_distances = [
+            [candidate.restaurant, None if candidate.distance is None else round(candidate.distance, 1)]
+            for candidate in order.candidate_restaurants.all()
+        ]
         orders_with_restaurants_and_locations.append([order, sorted_restaurants_and_distances])
 
     return orders_with_restaurants_and_locations
@@ -1,25 +1,142 @@
-from foodcartapp.models import RestaurantMenuItem
-
-
-def get_available_restaurants(product_ids, menu_items=None):
-    if menu_items is None:
-        menu_items_by_product_ids = RestaurantMenuItem.objects.filter(
-            availability=True,
-            product_id__in=product_ids,
-        ).select_related('restaurant', 'product')
-    else:
-        menu_items_by_product_ids = set(
-            filter(
-                lambda menu_item: menu_item.product_id in product_ids,
-                menu_items
-            )
-        )
-
-    restaurant_by_products = []
+import threading
+from collections import defaultdict
+
+from django.db.models import Count
+
+from foodcartapp.helpers.catalog_helpers import get_catalog_version
+from foodcartapp.models import Restaurant, RestaurantMenuItem
+
+
+def iterate_bits(bitset):
+    position = 0
+    while bitset:
+        if bitset & 1:
+            yield position
+        bitset >>= 1
+        position += 1
+
+
+def find_restaurant_ids(bitsets, product_ids):
+    """Ids of the restaurants having all the products available according to the bitsets."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return []
+
+    common_bitset = -1
     for product_id in product_ids:
-        restaurants = {
-            menu_item.restaurant for menu_item in menu_items_by_product_ids if menu_item.product_id == product_id
-        }
-        restaurant_by_products.append(restaurants)
+        common_bitset &= bitsets.get(product_id, 0)
+        if not common_bitset:
+            return []
+    return list(iterate_bits(common_bitset))
+
+
+class MenuIndex:
+    """Product id -> bitset of the restaurant ids having it available, rebuilt when the catalog version changes."""
+
+    def __init__(self):
+        self._version = None
+        self._bitsets = None
+        self._product_ids_by_restaurants = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        bitsets = {}
+        product_ids_by_restaurants = defaultdict(set)
+        menu_items = RestaurantMenuItem.objects.filter(availability=True).values_list('product_id', 'restaurant_id')
+        for product_id, restaurant_id in menu_items:
+            bitsets[product_id] = bitsets.get(product_id, 0) | (1 << restaurant_id)
+            product_ids_by_restaurants[restaurant_id].add(product_id)
+        return bitsets, product_ids_by_restaurants
+
+    def _get_index(self):
+        """Bitsets and restaurant menus of the current catalog version."""
+        version = get_catalog_version()
+        with self._lock:
+            if self._bitsets is None or self._version != version:
+                self._bitsets, self._product_ids_by_restaurants = self._build()
+                self._version = version
+            return self._bitsets, self._product_ids_by_restaurants
+
+    def get_bitsets(self):
+        """Bitsets of the current catalog version, to match many carts against one snapshot."""
+        bitsets, _ = self._get_index()
+        return bitsets
+
+    def get_restaurant_ids(self, product_ids):
+        if not product_ids:
+            return []
+        return find_restaurant_ids(self.get_bitsets(), product_ids)
+
+    def get_product_ids(self, restaurant_id):
+        """Ids of the products available in the restaurant."""
+        _, product_ids_by_restaurants = self._get_index()
+        with self._lock:
+            return set(product_ids_by_restaurants.get(restaurant_id, ()))
+
+    def count_products(self):
+        """Restaurant id -> number of available products."""
+        _, product_ids_by_restaurants = self._get_index()
+        with self._lock:
+            return {
+                restaurant_id: len(product_ids)
+                for restaurant_id, product_ids in product_ids_by_restaurants.items()
+            }
+
+    def can_cook(self, restaurant_id, product_ids):
+        product_ids = set(product_ids)
+        if not product_ids:
+            return False
+
+        bitsets, _ = self._get_index()
+        restaurant_bit = 1 << restaurant_id
+        return all(bitsets.get(product_id, 0) & restaurant_bit for product_id in product_ids)
+
+    def reset(self):
+        with self._lock:
+            self._version = None
+            self._bitsets = None
+            self._product_ids_by_restaurants = None
+
+
+menu_index = MenuIndex()
+
+
+def get_available_restaurant_ids(product_ids):
+    return menu_index.get_restaurant_ids(product_ids)
+
+
+def query_restaurant_ids_by_products(product_ids):
+    """Product id -> ids of the restaurants having it available, read from the database.
+
+    Used instead of the per-process menu index wherever the answer is shared between processes.
+    """
+    restaurant_ids_by_products = defaultdict(set)
+    menu_items = RestaurantMenuItem.objects.filter(
+        availability=True,
+        product_id__in=product_ids,
+    ).values_list('product_id', 'restaurant_id')
+    for product_id, restaurant_id in menu_items:
+        restaurant_ids_by_products[product_id].add(restaurant_id)
+    return restaurant_ids_by_products
+
+
+def query_available_restaurant_ids(product_ids):
+    """Ids of the restaurants having all the products available, read from the database."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return []
+    return list(
+        RestaurantMenuItem.objects
+        .filter(availability=True, product_id__in=product_ids)
+        .values('restaurant_id')
+        .annotate(products_count=Count('product_id'))
+        .filter(products_count=len(product_ids))
+        .values_list('restaurant_id', flat=True)
+    )
+
 
-    return set.intersection(*restaurant_by_products)
+def get_available_restaurants(product_ids):
+    restaurant_ids = get_available_restaurant_ids(product_ids)
+    if not restaurant_ids:
+        return set()
+    return set(Restaurant.objects.filter(id__in=restaurant_ids))
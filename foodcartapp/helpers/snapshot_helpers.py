@@ -0,0 +1,67 @@
+import gzip
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSORS = {
+    'gzip': lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body: brotli.compress(body, quality=11)
+
+ENCODINGS_BY_PREFERENCE = ['br', 'gzip', 'identity']
+
+
+def build_snapshot(data):
+    """Compact JSON of the data with precompressed variants: `{encoding: bytes}`."""
+    body = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+    snapshot = {'identity': body}
+    for encoding, compress in COMPRESSORS.items():
+        snapshot[encoding] = compress(body)
+    return snapshot
+
+
+def parse_accept_encoding(header):
+    qualities = {}
+    for coding in header.split(','):
+        name, *params = coding.strip().lower().split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name] = quality
+    return qualities
+
+
+def choose_encoding(request):
+    """The most compact encoding of a snapshot the client accepts."""
+    qualities = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    default_quality = qualities.get('*', 0.0)
+    for encoding in ENCODINGS_BY_PREFERENCE:
+        if encoding == 'identity':
+            return encoding
+        if encoding in COMPRESSORS and qualities.get(encoding, default_quality) > 0:
+            return encoding
+
+
+def snapshot_response(snapshot, encoding):
+    body = snapshot[encoding]
+    response = HttpResponse(body, content_type='application/json')
+    if encoding != 'identity':
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(len(body))
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,77 @@
+import gzip
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory
+
+from foodcartapp.helpers.snapshot_helpers import build_snapshot, choose_encoding, snapshot_response
+
+
+def get_random_catalog(products_count):
+    return [
+        {
+            'id': product_id,
+            'name': f'Бургер №{product_id}',
+            'price': f'{random.randint(100, 900)}.00',
+            'special_status': random.random() < 0.1,
+            'description': 'Сочная котлета из мраморной говядины, сыр чеддер, томаты и фирменный соус. ' * 2,
+            'category': {'id': product_id % 10, 'name': f'Категория {product_id % 10}'},
+            'image': f'/media/burger_{product_id}.jpg',
+            'restaurant': {'id': product_id, 'name': f'Бургер №{product_id}'},
+        }
+        for product_id in range(products_count)
+    ]
+
+
+def measure(make_response, requests_count):
+    started_at = time.process_time()
+    for _ in range(requests_count):
+        response = make_response()
+    return (time.process_time() - started_at) / requests_count, len(response.content)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает отдачу каталога через JsonResponse и из заранее сжатого снимка'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        catalog = get_random_catalog(options['products'])
+        requests_count = options['requests']
+        request_factory = RequestFactory()
+
+        def get_legacy_response():
+            return JsonResponse(catalog, safe=False, json_dumps_params={'ensure_ascii': False, 'indent': 4})
+
+        def get_legacy_gzip_response():
+            response = get_legacy_response()
+            response.content = gzip.compress(response.content)
+            return response
+
+        started_at = time.process_time()
+        snapshot = build_snapshot(catalog)
+        build_time = time.process_time() - started_at
+
+        results = [
+            ('JsonResponse, indent=4', measure(get_legacy_response, requests_count)),
+            ('JsonResponse, indent=4 + gzip на лету', measure(get_legacy_gzip_response, requests_count)),
+        ]
+        for accept_encoding in ['identity', 'gzip', 'br, gzip']:
+            request = request_factory.get('/api/products/', HTTP_ACCEPT_ENCODING=accept_encoding)
+            encoding = choose_encoding(request)
+            results.append((
+                f'снимок, {encoding}',
+                measure(lambda: snapshot_response(snapshot, choose_encoding(request)), requests_count),
+            ))
+
+        self.stdout.write(f'Товаров: {len(catalog)}, сборка снимка: {build_time * 1000:.1f} мс')
+        for name, (cpu_time, size) in results:
+            self.stdout.write(f'{name}: {cpu_time * 1000:.3f} мс CPU на запрос, {size / 1024:.1f} КиБ')
+        if 'br' not in snapshot:
+            self.stdout.write('brotli не установлен, вариант br не собран')
@@ -0,0 +1,43 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.helpers.dispatch_helpers import assign_restaurants, get_total_distance
+
+
+def get_random_candidates(orders_count, restaurants_count, candidates_per_order):
+    candidates = []
+    for order_id in range(orders_count):
+        for restaurant_id in random.sample(range(restaurants_count), candidates_per_order):
+            candidates.append((order_id, restaurant_id, random.uniform(0, 30)))
+    return candidates
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет скорость пакетного назначения ресторанов на синтетических заказах. '
+        'Замеряется только подбор ресторанов в памяти, без чтения кандидатов из базы и сохранения заказов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+        parser.add_argument('--restaurants', type=int, default=100)
+        parser.add_argument('--candidates', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        for orders_count in options['orders']:
+            candidates = get_random_candidates(orders_count, options['restaurants'], options['candidates'])
+            capacity = orders_count // options['restaurants'] + 1
+
+            started_at = time.perf_counter()
+            assignment = assign_restaurants(candidates, {}, default_capacity=capacity)
+            elapsed = time.perf_counter() - started_at
+
+            self.stdout.write(
+                f'{orders_count} заказов: {elapsed * 1000:.0f} мс, '
+                f'назначено {len(assignment)}, '
+                f'суммарное расстояние {get_total_distance(candidates, assignment):.0f} км'
+            )
@@ -0,0 +1,83 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from foodcartapp.helpers.restaurant_helpers import menu_index
+from foodcartapp.models import Product, Restaurant, RestaurantMenuItem
+from foodcartapp.views import register_order, register_orders_batch
+
+
+def create_menu(products_count):
+    restaurant = Restaurant.objects.create(name='Тестовый ресторан', address='Москва, Тверская, 1')
+    products = [
+        Product.objects.create(name=f'Бургер №{number}', price=random.randint(100, 900), image='burger.jpg')
+        for number in range(products_count)
+    ]
+    RestaurantMenuItem.objects.bulk_create([
+        RestaurantMenuItem(restaurant=restaurant, product=product) for product in products
+    ])
+    menu_index.reset()
+    return [product.id for product in products]
+
+
+def get_random_orders(orders_count, product_ids, items_per_order):
+    return [
+        {
+            'firstname': 'Иван',
+            'lastname': 'Иванов',
+            'phonenumber': '+79001234567',
+            'address': f'Москва, Ленинский проспект, {random.randint(1, 200)}',
+            'products': [
+                {'product': product_id, 'quantity': random.randint(1, 3)}
+                for product_id in random.sample(product_ids, items_per_order)
+            ],
+        }
+        for _ in range(orders_count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость приёма заказов по одному и пакетом. Все созданные записи откатываются'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--items', type=int, default=5, help='товаров в заказе')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def post(self, view, payload):
+        request = RequestFactory().post('/api/', json.dumps(payload), content_type='application/json')
+        response = view(request)
+        if response.status_code != 200:
+            raise RuntimeError(f'{response.status_code}: {response.data}')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            product_ids = create_menu(products_count=max(options['items'], 50))
+            orders = get_random_orders(options['orders'], product_ids, options['items'])
+
+            started_at = time.perf_counter()
+            for order in orders:
+                self.post(register_order, order)
+            single_time = time.perf_counter() - started_at
+
+            started_at = time.perf_counter()
+            batch_size = options['batch_size']
+            for start in range(0, len(orders), batch_size):
+                self.post(register_orders_batch, orders[start:start + batch_size])
+            batch_time = time.perf_counter() - started_at
+
+            transaction.set_rollback(True)
+        menu_index.reset()
+
+        self.stdout.write(f'Заказов: {len(orders)}, товаров в заказе: {options["items"]}')
+        self.stdout.write(f'По одному: {single_time:.2f} с, {len(orders) / single_time:.0f} заказов/с')
+        self.stdout.write(
+            f'Пакетами по {batch_size}: {batch_time:.2f} с, {len(orders) / batch_time:.0f} заказов/с '
+            f'(x{single_time / batch_time:.1f})'
+        )
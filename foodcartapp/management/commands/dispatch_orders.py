@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodcartapp.helpers.dispatch_helpers import dispatch_orders
+
+
+class Command(BaseCommand):
+    help = 'Назначает необработанным заказам ближайшие рестораны с учётом их загрузки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capacity', type=int, default=settings.RESTAURANT_ORDERS_CAPACITY)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        assignment = dispatch_orders(capacity=options['capacity'], dry_run=options['dry_run'])
+        self.stdout.write(f'Назначено ресторанов: {len(assignment)}')
@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.core.management.base import BaseCommand
+
+from foodcartapp.helpers.candidate_helpers import refresh_located_addresses_candidates
+from foodcartapp.models import Order, Restaurant
+from locations.models import Location
+from locations.services import geohash
+from locations.services.addresses import normalize_address
+from locations.services.geocoder import OfflineGeocoder, get_geocoder
+from locations.services.geocoder_client import geocoder_client
+from locations.services.rate_limit import TokenBucket
+
+
+def get_missing_addresses():
+    """One address per canonical key that has no location yet."""
+    addresses = {
+        *Order.objects.values_list('address', flat=True).distinct(),
+        *Restaurant.objects.exclude(address='').values_list('address', flat=True).distinct(),
+    }
+    known_keys = set(Location.objects.values_list('address_key', flat=True))
+    addresses_by_keys = {}
+    for address in sorted(addresses):
+        address_key = normalize_address(address)
+        if address_key not in known_keys:
+            addresses_by_keys.setdefault(address_key, address)
+    return sorted(addresses_by_keys.values())
+
+
+def geocode(address, fetch, rate_limiter):
+    rate_limiter.acquire()
+    try:
+        return address, fetch(address), None
+    except requests.RequestException as error:
+        return address, None, error
+
+
+def build_location(address, coords):
+    longitude, latitude = map(float, coords)
+    return Location(
+        address=address,
+        address_key=normalize_address(address),
+        longitude=longitude,
+        latitude=latitude,
+        geohash=geohash.encode(latitude, longitude),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Определяет координаты всех адресов заказов и ресторанов, для которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--rate', type=float, default=10, help='запросов к геокодеру в секунду')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--stub', action='store_true', help='использовать офлайн-заглушку вместо геокодера')
+        parser.add_argument('--stub-latency', type=float, default=0.05, help='задержка заглушки в секундах')
+
+    def handle(self, *args, **options):
+        addresses = get_missing_addresses()
+        self.stdout.write(f'Адресов без координат: {len(addresses)}')
+        if not addresses:
+            return
+
+        if options['stub']:
+            geocoder = OfflineGeocoder(latency=options['stub_latency'])
+        else:
+            geocoder = get_geocoder()
+        fetch = geocoder.fetch_coordinates
+        rate_limiter = TokenBucket(options['rate'])
+
+        locations = []
+        located_address_keys = set()
+        stats = {'found': 0, 'not_found': 0, 'errors': 0}
+        started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(geocode, address, fetch, rate_limiter) for address in addresses]
+            for done_count, future in enumerate(as_completed(futures), start=1):
+                address, coords, error = future.result()
+                if error is not None:
+                    stats['errors'] += 1
+                    self.stderr.write(f'{address}: {error}')
+                elif coords is None:
+                    stats['not_found'] += 1
+                else:
+                    stats['found'] += 1
+                    location = build_location(address, coords)
+                    locations.append(location)
+                    located_address_keys.add(location.address_key)
+
+                if len(locations) >= options['batch_size']:
+                    Location.objects.bulk_create(locations, ignore_conflicts=True)
+                    locations = []
+                if done_count % options['batch_size'] == 0 or done_count == len(addresses):
+                    elapsed = time.monotonic() - started_at
+                    self.stdout.write(
+                        f'{done_count}/{len(addresses)} за {elapsed:.1f} с ({done_count / elapsed:.1f} адресов/с)'
+                    )
+
+        Location.objects.bulk_create(locations, ignore_conflicts=True)
+        self.stdout.write(
+            f"Найдено: {stats['found']}, не найдено: {stats['not_found']}, ошибок: {stats['errors']}"
+        )
+        if not options['stub']:
+            self.stdout.write(f'Геокодер: {geocoder_client.metrics.snapshot()}')
+        refresh_located_addresses_candidates(located_address_keys)
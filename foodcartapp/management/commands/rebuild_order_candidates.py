@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.helpers.candidate_helpers import refresh_unfinished_orders_candidates
+from foodcartapp.helpers.restaurant_helpers import menu_index
+from foodcartapp.models import OrderCandidateRestaurant
+from locations.services.distance_cache import distance_cache
+
+
+def get_candidate_pairs():
+    return set(OrderCandidateRestaurant.objects.values_list('order_id', 'restaurant_id'))
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу подходящих ресторанов для незавершённых заказов с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        menu_index.reset()
+        distance_cache.reset_stats()
+
+        with transaction.atomic():
+            stored_pairs = get_candidate_pairs()
+            OrderCandidateRestaurant.objects.all().delete()
+            orders_count = refresh_unfinished_orders_candidates(batch_size=options['batch_size'])
+            rebuilt_pairs = get_candidate_pairs()
+
+        self.stdout.write(f'Заказов: {orders_count}, подходящих ресторанов: {len(rebuilt_pairs)}')
+        self.stdout.write(f'Не хватало записей: {len(rebuilt_pairs - stored_pairs)}')
+        self.stdout.write(f'Лишних записей: {len(stored_pairs - rebuilt_pairs)}')
+        self.stdout.write(f'Кэш расстояний: {distance_cache.stats}')
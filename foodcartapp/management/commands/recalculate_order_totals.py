@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сохранённые суммы и количество товаров заказов с их позициями и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='только проверить, ничего не исправлять')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        orders = (
+            Order.objects
+            .with_items_totals()
+            .only('id', 'total_price', 'items_count')
+            .order_by('id')
+        )
+        mismatched_orders = []
+        for order in orders.iterator(chunk_size=options['batch_size']):
+            if (order.total_price, order.items_count) == (order.items_total_price, order.items_total_count):
+                continue
+            self.stdout.write(
+                f'{order}: сумма {order.total_price} вместо {order.items_total_price}, '
+                f'товаров {order.items_count} вместо {order.items_total_count}'
+            )
+            order.total_price = order.items_total_price
+            order.items_count = order.items_total_count
+            mismatched_orders.append(order)
+
+        if options['check']:
+            if mismatched_orders:
+                raise CommandError(f'Заказов с расхождениями: {len(mismatched_orders)}')
+            self.stdout.write('Расхождений нет')
+            return
+
+        Order.objects.bulk_update(
+            mismatched_orders,
+            ['total_price', 'items_count'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(f'Исправлено заказов: {len(mismatched_orders)}')
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_alter_order_payment_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='foodcartapp_status_961f2c_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:47
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+BATCH_SIZE = 1000
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    last_id = 0
+    while True:
+        orders = list(
+            Order.objects
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .annotate(
+                items_total_price=Sum(F('items__product_price') * F('items__quantity')),
+                items_total_count=Sum('items__quantity'),
+            )
+            .only('id')[:BATCH_SIZE]
+        )
+        if not orders:
+            return
+        for order in orders:
+            order.total_price = order.items_total_price or 0
+            order.items_count = order.items_total_count or 0
+        Order.objects.bulk_update(orders, ['total_price', 'items_count'])
+        last_id = orders[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0058_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='товаров, шт.'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='сумма'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
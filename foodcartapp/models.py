@@ -1,9 +1,15 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from phonenumber_field.modelfields import PhoneNumberField
 
 from locations.models import Location
+from locations.services.addresses import normalize_address
 
 
 class Restaurant(models.Model):
@@ -16,6 +22,7 @@ class Restaurant(models.Model):
         max_length=100,
         blank=True,
     )
+    address_key = models.CharField('ключ адреса', max_length=255, blank=True, db_index=True)
     contact_phone = models.CharField(
         'контактный телефон',
         max_length=50,
@@ -29,6 +36,10 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.address_key = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
@@ -128,13 +139,20 @@ class RestaurantMenuItem(models.Model):
 
 
 class OrderQuerySet(models.QuerySet):
-    def with_price(self):
+    def with_items_totals(self):
+        """Totals aggregated from the items, to check the stored `total_price` and `items_count`."""
         return self.annotate(
-            price=models.Sum(
-                models.F('items__product_price') * models.F('items__quantity')
+            items_total_price=Coalesce(
+                models.Sum(models.F('items__product_price') * models.F('items__quantity')),
+                0,
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
             ),
+            items_total_count=Coalesce(models.Sum('items__quantity'), 0),
         )
 
+    def unfinished(self):
+        return self.exclude(status=Order.COMPLETE_STATUS)
+
 
 class Order(models.Model):
     PROCESS_STATUS = 1
@@ -160,7 +178,9 @@ class Order(models.Model):
     lastname = models.CharField('фамилия', max_length=100)
     phonenumber = PhoneNumberField('номер телефона')
     address = models.CharField('адрес для доставки', max_length=255)
+    address_key = models.CharField('ключ адреса', max_length=255, blank=True, db_index=True)
     created_at = models.DateTimeField('время заказа', auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField('время изменения', auto_now=True)
     called_at = models.DateTimeField('время звонка', blank=True, null=True, db_index=True)
     delivered_at = models.DateTimeField('время доставки', blank=True, null=True, db_index=True)
     status = models.IntegerField('статус', choices=STATUS_CHOICES, default=PROCESS_STATUS, db_index=True)
@@ -181,6 +201,14 @@ class Order(models.Model):
         null=True,
         blank=True
     )
+    total_price = models.DecimalField(
+        'сумма',
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0)]
+    )
+    items_count = models.PositiveIntegerField('товаров, шт.', default=0)
 
     objects = OrderQuerySet.as_manager()
 
@@ -191,11 +219,28 @@ class Order(models.Model):
             models.Index(fields=['firstname', 'lastname']),
             models.Index(fields=['phonenumber']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'created_at', 'id']),
+            models.Index(fields=['updated_at', 'id']),
         ]
 
     def __str__(self):
         return f'Заказ {self.id}'
 
+    def save(self, *args, **kwargs):
+        self.address_key = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
+    def set_totals(self, order_items):
+        self.total_price = sum(order_item.product_price * order_item.quantity for order_item in order_items)
+        self.items_count = sum(order_item.quantity for order_item in order_items)
+
+    def update_totals(self):
+        """Recalculate the totals from the items in the database and save them."""
+        order = Order.objects.with_items_totals().get(pk=self.pk)
+        self.total_price = order.items_total_price
+        self.items_count = order.items_total_count
+        Order.objects.filter(pk=self.pk).update(total_price=self.total_price, items_count=self.items_count)
+
 
 class OrderItem(models.Model):
     product = models.ForeignKey(
@@ -228,3 +273,70 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return self.product.name
+
+
+class OrderCandidateRestaurant(models.Model):
+    order = models.ForeignKey(
+        Order,
+        related_name='candidate_restaurants',
+        verbose_name='заказ',
+        on_delete=models.CASCADE
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        related_name='candidate_orders',
+        verbose_name='ресторан',
+        on_delete=models.CASCADE
+    )
+    distance = models.FloatField('расстояние до клиента, км', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'подходящий ресторан'
+        verbose_name_plural = 'подходящие рестораны'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+
+    def __str__(self):
+        return f'{self.order} - {self.restaurant.name}'
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField('ключ', max_length=255, unique=True)
+    fingerprint = models.CharField('отпечаток запроса', max_length=64)
+    response_status = models.PositiveSmallIntegerField('код ответа', null=True, blank=True)
+    response_body = models.JSONField('ответ', null=True, blank=True)
+    created_at = models.DateTimeField('создан', auto_now_add=True)
+    expires_at = models.DateTimeField('действует до', db_index=True)
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
+
+    @classmethod
+    def claim(cls, key, fingerprint):
+        """Record of the key and whether this call created it; a concurrent call waits for the first to commit."""
+        now = timezone.now()
+        record = cls.objects.filter(key=key, expires_at__gt=now).first()
+        if record is not None:
+            return record, False
+
+        cls.objects.filter(key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = cls.objects.create(
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+                )
+        except IntegrityError:
+            return cls.objects.get(key=key), False
+        return record, True
+
+    def save_response(self, response):
+        self.response_status = response.status_code
+        self.response_body = response.data
+        self.save(update_fields=['response_status', 'response_body'])
@@ -1,11 +1,39 @@
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .helpers.cart_helpers import get_cart_products
+from .helpers.catalog_helpers import PRODUCT_FIELDS
+from .models import Order, OrderItem, Product
+
+
+class BulkProductsListSerializer(serializers.ListSerializer):
+    """Resolves the products of all the items with one query, or from the `products_by_ids` context."""
+
+    def to_internal_value(self, data):
+        order_items = super().to_internal_value(data)
+
+        products = self.context.get('products_by_ids')
+        if products is None:
+            products = Product.objects.in_bulk({order_item['product'] for order_item in order_items})
+        errors = []
+        for order_item in order_items:
+            product = products.get(order_item['product'])
+            if product is None:
+                message = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+                errors.append({'product': [message.format(pk_value=order_item['product'])]})
+            else:
+                order_item['product'] = product
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return order_items
 
 
 class ProductsSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(min_value=1)
+
     class Meta:
         model = OrderItem
         fields = ['quantity', 'product']
+        list_serializer_class = BulkProductsListSerializer
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -14,3 +42,41 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['firstname', 'lastname', 'phonenumber', 'address', 'products']
+
+
+class ProductQuerySerializer(serializers.Serializer):
+    category = serializers.IntegerField(required=False, min_value=1)
+    restaurant = serializers.IntegerField(required=False, min_value=1)
+    special_status = serializers.BooleanField(allow_null=True, default=None)
+    fields = serializers.CharField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100)
+    cursor = serializers.IntegerField(required=False, min_value=0)
+
+    def validate_fields(self, value):
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        unknown_fields = [field for field in fields if field not in PRODUCT_FIELDS]
+        if unknown_fields:
+            raise serializers.ValidationError(f'Неизвестные поля: {", ".join(unknown_fields)}')
+        return [field for field in PRODUCT_FIELDS if field in fields]
+
+
+class CartLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=32767)
+
+
+class CartSerializer(serializers.Serializer):
+    products = CartLineSerializer(many=True, allow_empty=False)
+
+    def validate(self, attrs):
+        cart_products = get_cart_products(cart_line['product'] for cart_line in attrs['products'])
+        errors = []
+        for cart_line in attrs['products']:
+            if cart_line['product'] in cart_products['prices']:
+                errors.append({})
+            else:
+                message = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+                errors.append({'product': [message.format(pk_value=cart_line['product'])]})
+        if any(errors):
+            raise serializers.ValidationError({'products': errors})
+        return {**attrs, 'cart_products': cart_products}
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from locations.models import Location
+from .helpers.candidate_helpers import (
+    refresh_menu_item_candidates,
+    refresh_moved_restaurant_candidates,
+    refresh_unfinished_orders_candidates,
+)
+from .helpers.catalog_helpers import bump_catalog_version
+from .models import Order, OrderCandidateRestaurant, Product, ProductCategory, Restaurant, RestaurantMenuItem
+
+
+@receiver(pre_save, sender=RestaurantMenuItem)
+def remember_menu_item_position(sender, instance, **kwargs):
+    instance._previous_position = None
+    if instance.pk:
+        instance._previous_position = (
+            RestaurantMenuItem.objects
+            .filter(pk=instance.pk)
+            .values_list('restaurant_id', 'product_id')
+            .first()
+        )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def update_candidates_on_menu_item_save(sender, instance, **kwargs):
+    positions = {(instance.restaurant_id, instance.product_id)}
+    previous_position = getattr(instance, '_previous_position', None)
+    if previous_position is not None:
+        positions.add(previous_position)
+
+    for restaurant_id, product_id in positions:
+        refresh_menu_item_candidates(restaurant_id, [product_id])
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def update_candidates_on_menu_item_delete(sender, instance, **kwargs):
+    OrderCandidateRestaurant.objects.filter(
+        restaurant_id=instance.restaurant_id,
+        order__items__product_id=instance.product_id,
+    ).delete()
+
+
+@receiver(pre_save, sender=Restaurant)
+def remember_restaurant_address(sender, instance, **kwargs):
+    instance._previous_address_key = None
+    if instance.pk:
+        instance._previous_address_key = (
+            Restaurant.objects
+            .filter(pk=instance.pk)
+            .values_list('address_key', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Restaurant)
+def update_candidates_on_restaurant_move(sender, instance, created, **kwargs):
+    previous_address_key = getattr(instance, '_previous_address_key', None)
+    if created or previous_address_key is None:
+        return
+    if instance.address_key != previous_address_key:
+        refresh_moved_restaurant_candidates(
+            instance.id,
+            get_address_points([previous_address_key, instance.address_key]),
+        )
+
+
+def get_address_points(address_keys):
+    return list(Location.objects.filter(address_key__in=address_keys).values_list('latitude', 'longitude'))
+
+
+def refresh_orders_at_address(address_key):
+    """Recompute candidates of unfinished orders delivered to the address and put them in the feed."""
+    order_ids = list(Order.objects.unfinished().filter(address_key=address_key).values_list('id', flat=True))
+    if not order_ids:
+        return
+    refresh_unfinished_orders_candidates(Order.objects.filter(id__in=order_ids))
+    Order.objects.filter(id__in=order_ids).update(updated_at=timezone.now())
+
+
+def refresh_restaurants_at_address(address_key, previous_point):
+    restaurant_ids = list(Restaurant.objects.filter(address_key=address_key).values_list('id', flat=True))
+    if not restaurant_ids:
+        return
+    points = get_address_points([address_key])
+    if previous_point is not None:
+        points.append(previous_point)
+    for restaurant_id in restaurant_ids:
+        refresh_moved_restaurant_candidates(restaurant_id, points)
+
+
+@receiver(post_save, sender=Location)
+def update_candidates_on_location_change(sender, instance, **kwargs):
+    # `_previous_coordinates` is remembered by the `locations` app signals.
+    refresh_restaurants_at_address(instance.address_key, getattr(instance, '_previous_coordinates', None))
+    refresh_orders_at_address(instance.address_key)
+
+
+@receiver(post_delete, sender=Location)
+def update_candidates_on_location_delete(sender, instance, **kwargs):
+    refresh_restaurants_at_address(instance.address_key, (instance.latitude, instance.longitude))
+    refresh_orders_at_address(instance.address_key)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
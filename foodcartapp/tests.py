@@ -0,0 +1,783 @@
+import gzip
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from foodcartapp.helpers.candidate_helpers import refresh_order_candidates
+from foodcartapp.helpers.catalog_helpers import bump_catalog_version
+from foodcartapp.helpers.dispatch_helpers import assign_restaurants, dispatch_orders
+from foodcartapp.helpers.restaurant_helpers import MenuIndex, menu_index
+from foodcartapp.models import (
+    IdempotencyKey,
+    Order,
+    OrderCandidateRestaurant,
+    OrderItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from foodcartapp.views import save_orders
+from locations.models import Location
+from locations.services import geohash
+from locations.services.rate_limit import TokenBucket
+
+# Tests counting queries keep the cache out of the database so only the app queries are counted.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MenuIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = MenuIndex()
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Ресторанная, {number}')
+            for number in range(3)
+        ]
+        self.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100, image='burger.jpg')
+            for number in range(3)
+        ]
+        for restaurant in self.restaurants[:2]:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.products[0])
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[0], product=self.products[1])
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[2], product=self.products[2], availability=False)
+
+    def get_restaurant_ids(self, *products):
+        return sorted(self.index.get_restaurant_ids([product.id for product in products]))
+
+    def test_get_restaurant_ids(self):
+        self.assertEqual(self.get_restaurant_ids(self.products[0]), [self.restaurants[0].id, self.restaurants[1].id])
+        self.assertEqual(self.get_restaurant_ids(self.products[0], self.products[1]), [self.restaurants[0].id])
+        self.assertEqual(self.get_restaurant_ids(self.products[2]), [])
+        self.assertEqual(self.get_restaurant_ids(), [])
+        self.assertEqual(self.index.get_restaurant_ids([1000]), [])
+
+    def test_can_cook(self):
+        self.assertTrue(self.index.can_cook(self.restaurants[0].id, [self.products[0].id, self.products[1].id]))
+        self.assertFalse(self.index.can_cook(self.restaurants[1].id, [self.products[0].id, self.products[1].id]))
+        self.assertFalse(self.index.can_cook(self.restaurants[2].id, [self.products[2].id]))
+        self.assertFalse(self.index.can_cook(self.restaurants[0].id, []))
+
+    def test_reset(self):
+        self.get_restaurant_ids(self.products[0])
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[0]).delete()
+        self.assertEqual(len(self.get_restaurant_ids(self.products[0])), 2)
+
+        self.index.reset()
+
+        self.assertEqual(self.get_restaurant_ids(self.products[0]), [self.restaurants[1].id])
+
+    def test_rebuilt_when_catalog_version_changes(self):
+        self.get_restaurant_ids(self.products[0])
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[1]).update(availability=False)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.get_restaurant_ids(self.products[0])), 2)
+        bump_catalog_version()
+
+        self.assertEqual(self.get_restaurant_ids(self.products[0]), [self.restaurants[0].id])
+
+    def test_rebuilt_after_menu_change_commits(self):
+        self.get_restaurant_ids(self.products[2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.filter(product=self.products[2]).update(availability=True)
+            RestaurantMenuItem.objects.get(product=self.products[2]).save()
+            self.assertEqual(self.get_restaurant_ids(self.products[2]), [])
+
+        self.assertEqual(self.get_restaurant_ids(self.products[2]), [self.restaurants[2].id])
+
+    def test_rolled_back_menu_change_is_not_indexed(self):
+        self.get_restaurant_ids(self.products[2])
+
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                RestaurantMenuItem.objects.create(restaurant=self.restaurants[1], product=self.products[2])
+                raise RuntimeError
+
+        self.assertEqual(self.get_restaurant_ids(self.products[2]), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductListApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        menu_index.reset()
+        self.restaurant = Restaurant.objects.create(name='Ресторан', address='Ресторанная, 1')
+        self.category = ProductCategory.objects.create(name='Бургеры')
+        self.product = Product.objects.create(name='Бургер', price=100, image='burger.jpg', category=self.category)
+        RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=self.product)
+
+    def test_catalog_is_cached(self):
+        response = self.client.get('/api/products/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['name'] for product in json.loads(response.content)], ['Бургер'])
+        self.assertTrue(response['ETag'])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/products/').content, response.content)
+        self.assertEqual(len(queries), 0)
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/products/')['ETag']
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_catalog_changes_bump_version(self):
+        etag = self.client.get('/api/products/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Бургеры и роллы'
+            self.category.save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.content)[0]['category']['name'], 'Бургеры и роллы')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.filter(product=self.product).delete()
+        self.assertEqual(json.loads(self.client.get('/api/products/').content), [])
+
+    def test_precompressed_catalog(self):
+        plain_response = self.client.get('/api/products/')
+        gzip_response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertNotIn('Content-Encoding', plain_response)
+        self.assertEqual(gzip_response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip_response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(gzip_response.content), plain_response.content)
+        self.assertNotEqual(gzip_response['ETag'], plain_response['ETag'])
+        self.assertNotIn(b'\n', plain_response.content)
+
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+
+
+class ProductQueryApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Ресторанная, {number}')
+            for number in range(2)
+        ]
+        self.burgers = ProductCategory.objects.create(name='Бургеры')
+        self.products = [
+            Product.objects.create(
+                name=f'Бургер {number}',
+                price=100 + number,
+                image=f'burger_{number}.jpg',
+                category=self.burgers if number % 2 else None,
+                special_status=number == 0,
+            )
+            for number in range(5)
+        ]
+        for product in self.products:
+            RestaurantMenuItem.objects.create(restaurant=self.restaurants[0], product=product)
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[1], product=self.products[0])
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[1], product=self.products[1], availability=False)
+
+    def get_products(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_filters(self):
+        self.assertEqual(
+            [product['id'] for product in self.get_products(category=self.burgers.id)],
+            [self.products[1].id, self.products[3].id],
+        )
+        self.assertEqual(
+            [product['id'] for product in self.get_products(restaurant=self.restaurants[1].id)],
+            [self.products[0].id],
+        )
+        self.assertEqual(
+            [product['id'] for product in self.get_products(special_status='true')],
+            [self.products[0].id],
+        )
+
+    def test_fields_projection(self):
+        products = self.get_products(fields='category,name', restaurant=self.restaurants[0].id, limit=2)
+
+        self.assertEqual(products, [
+            {'name': 'Бургер 0', 'category': None},
+            {'name': 'Бургер 1', 'category': {'id': self.burgers.id, 'name': 'Бургеры'}},
+        ])
+        self.assertEqual(self.get_products(fields='image', limit=1), [{'image': '/media/burger_0.jpg'}])
+
+    def test_cursor_pagination(self):
+        response = self.client.get('/api/products/', {'limit': 2, 'fields': 'id'})
+        pages = [json.loads(response.content)]
+        while 'Link' in response:
+            next_url = response['Link'].split(';')[0].strip('<>')
+            response = self.client.get(next_url)
+            pages.append(json.loads(response.content))
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([product['id'] for page in pages for product in page], [product.id for product in self.products])
+
+    def test_invalid_query(self):
+        response = self.client.get('/api/products/', {'fields': 'name,secret', 'limit': 1000})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(json.loads(response.content)), {'fields', 'limit'})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RestaurantMenuApiTest(TestCase):
+    def setUp(self):
+        menu_index.reset()
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Ресторанная, {number}')
+            for number in range(2)
+        ]
+        self.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100, image='burger.jpg')
+            for number in range(3)
+        ]
+        for product in self.products:
+            RestaurantMenuItem.objects.create(restaurant=self.restaurants[0], product=product)
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[1], product=self.products[0])
+
+    def get_menu_counts(self):
+        restaurants = json.loads(self.client.get('/api/restaurants/').content)
+        return [restaurant['menu_count'] for restaurant in restaurants]
+
+    def test_menu_follows_menu_items(self):
+        self.assertEqual(self.get_menu_counts(), [3, 1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            menu_item = RestaurantMenuItem.objects.get(restaurant=self.restaurants[0], product=self.products[1])
+            menu_item.availability = False
+            menu_item.save()
+            RestaurantMenuItem.objects.create(restaurant=self.restaurants[1], product=self.products[2])
+            RestaurantMenuItem.objects.get(restaurant=self.restaurants[1], product=self.products[0]).delete()
+
+        self.assertEqual(self.get_menu_counts(), [2, 1])
+        menu = json.loads(self.client.get(f'/api/restaurants/{self.restaurants[0].id}/menu/').content)
+        self.assertEqual(menu['name'], 'Ресторан 0')
+        self.assertEqual([product['id'] for product in menu['products']], [self.products[0].id, self.products[2].id])
+
+    def test_menu_is_served_from_index(self):
+        self.get_menu_counts()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/restaurants/{self.restaurants[1].id}/menu/')
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([product['name'] for product in json.loads(response.content)['products']], ['Бургер 0'])
+        self.assertEqual(self.client.get('/api/restaurants/100/menu/').status_code, 404)
+
+    def test_menu_follows_other_processes(self):
+        self.assertEqual(self.get_menu_counts(), [3, 1])
+
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[0], product=self.products[0]).delete()
+        bump_catalog_version()
+
+        self.assertEqual(self.get_menu_counts(), [2, 1])
+
+    def test_menu_survives_concurrent_reset(self):
+        get_index = menu_index._get_index
+
+        def get_index_and_reset():
+            index = get_index()
+            menu_index.reset()
+            return index
+
+        with mock.patch.object(menu_index, '_get_index', get_index_and_reset):
+            menu = json.loads(self.client.get(f'/api/restaurants/{self.restaurants[1].id}/menu/').content)
+            self.assertEqual(self.get_menu_counts(), [3, 1])
+
+        self.assertEqual([product['id'] for product in menu['products']], [self.products[0].id])
+
+
+class RegisterOrderApiTest(TestCase):
+    def setUp(self):
+        menu_index.reset()
+        restaurant = Restaurant.objects.create(name='Ресторан', address='Ресторанная, 1')
+        self.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100, image='burger.jpg')
+            for number in range(20)
+        ]
+        for product in self.products:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=product)
+
+    def get_order_payload(self, product_ids):
+        return {
+            'firstname': 'Иван',
+            'lastname': 'Иванов',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская, 1',
+            'products': [{'product': product_id, 'quantity': 1} for product_id in product_ids],
+        }
+
+    def post_order(self, payload, **headers):
+        return self.client.post('/api/order/', payload, content_type='application/json', **headers)
+
+    def test_query_count_does_not_grow_with_cart(self):
+        self.post_order(self.get_order_payload([self.products[0].id]))
+        query_counts = []
+        for products_count in [2, 20]:
+            payload = self.get_order_payload([product.id for product in self.products[:products_count]])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_order(payload)
+            self.assertEqual(response.status_code, 200)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_unknown_products_are_reported_at_once(self):
+        response = self.post_order(self.get_order_payload([self.products[0].id, 1000, 1001]))
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['products']
+        self.assertEqual(errors[0], {})
+        self.assertIn('1000', errors[1]['product'][0])
+        self.assertIn('1001', errors[2]['product'][0])
+        self.assertFalse(Order.objects.exists())
+
+    def test_retry_with_idempotency_key_is_replayed(self):
+        payload = self.get_order_payload([self.products[0].id, self.products[1].id])
+
+        first_response = self.post_order(payload, HTTP_IDEMPOTENCY_KEY='order-1')
+        with CaptureQueriesContext(connection) as queries:
+            second_response = self.post_order(payload, HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(first_response.status_code, 200)
+        self.assertEqual(second_response.status_code, 200)
+        self.assertEqual(second_response.json(), first_response.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertFalse([query for query in queries if query['sql'].startswith('INSERT')])
+
+        response = self.post_order(self.get_order_payload([self.products[2].id]), HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(response.status_code, 422)
+
+    def test_failed_request_releases_key(self):
+        response = self.post_order(self.get_order_payload([1000]), HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        response = self.post_order(self.get_order_payload([self.products[0].id]), HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_expired_key_is_reused(self):
+        payload = self.get_order_payload([self.products[0].id])
+        self.post_order(payload, HTTP_IDEMPOTENCY_KEY='order-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        self.post_order(payload, HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_batch_reports_each_order(self):
+        payload = [
+            self.get_order_payload([self.products[0].id, self.products[1].id]),
+            self.get_order_payload([1000]),
+            {**self.get_order_payload([self.products[2].id]), 'phonenumber': 'не телефон'},
+            self.get_order_payload([self.products[3].id]),
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/batch/', payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 207)
+        results = response.json()
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'error', 'created'])
+        self.assertIn('products', results[1]['errors'])
+        self.assertIn('phonenumber', results[2]['errors'])
+        created_orders = [Order.objects.get(pk=results[index]['id']) for index in [0, 3]]
+        self.assertEqual(
+            [list(order.items.values_list('product_id', flat=True)) for order in created_orders],
+            [[self.products[0].id, self.products[1].id], [self.products[3].id]],
+        )
+        self.assertEqual({order.address_key for order in created_orders}, {'москва тверская 1'})
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(len([query for query in queries if 'FROM "foodcartapp_product"' in query['sql']]), 1)
+
+    def test_batch_parses_product_ids_like_single_orders(self):
+        payload = self.get_order_payload([f'{self.products[0].id}.0'])
+
+        self.assertEqual(self.post_order(payload).status_code, 200)
+        response = self.client.post('/api/orders/batch/', [payload], content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_batch_matches_restaurants_against_one_menu_snapshot(self):
+        payload = [self.get_order_payload([product.id]) for product in self.products[:3]]
+
+        with mock.patch.object(menu_index, '_get_index', wraps=menu_index._get_index) as get_index:
+            response = self.client.post('/api/orders/batch/', payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        get_index.assert_called_once_with()
+
+    def test_batch_without_created_orders_fails(self):
+        payload = [self.get_order_payload([1000]), {**self.get_order_payload([self.products[0].id]), 'address': ''}]
+
+        response = self.client.post('/api/orders/batch/', payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual([result['status'] for result in response.json()], ['error', 'error'])
+        self.assertFalse(Order.objects.exists())
+
+    def get_unsaved_orders(self, count):
+        return [
+            Order(firstname='Иван', lastname='Иванов', phonenumber='+79001234567', address=f'Тверская, {number}')
+            for number in range(count)
+        ]
+
+    def test_orders_are_saved_one_by_one_without_bulk_returning(self):
+        orders = self.get_unsaved_orders(3)
+
+        with mock.patch.object(connection.features, 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(Order.objects, 'bulk_create') as bulk_create:
+            save_orders(orders)
+
+        bulk_create.assert_not_called()
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {order.id for order in orders})
+
+    def test_orders_are_bulk_created_with_bulk_returning(self):
+        orders = self.get_unsaved_orders(3)
+
+        def bulk_create_returning_ids(orders):
+            # SQLite on Django 3.2 cannot return ids from a bulk insert; emulate a backend that can.
+            for order in orders:
+                order.save()
+            return orders
+
+        with mock.patch.object(connection.features, 'can_return_rows_from_bulk_insert', True), \
+                mock.patch.object(Order.objects, 'bulk_create', side_effect=bulk_create_returning_ids) as bulk_create, \
+                mock.patch.object(Order, 'save', autospec=True, side_effect=Order.save) as save:
+            save_orders(orders)
+
+        bulk_create.assert_called_once_with(orders)
+        self.assertEqual(save.call_count, 3)
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {order.id for order in orders})
+
+    def test_batch_requires_list(self):
+        response = self.client.post('/api/orders/batch/', {'orders': []}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_totals_are_stored(self):
+        payload = self.get_order_payload([self.products[0].id, self.products[1].id])
+        payload['products'][1]['quantity'] = 3
+
+        self.post_order(payload)
+
+        order = Order.objects.get()
+        self.assertEqual((order.total_price, order.items_count), (400, 4))
+
+    def test_order_totals_are_recalculated(self):
+        self.post_order(self.get_order_payload([self.products[0].id]))
+        order = Order.objects.get()
+        OrderItem.objects.filter(order=order).update(quantity=5)
+
+        with self.assertRaises(CommandError):
+            call_command('recalculate_order_totals', '--check', stdout=StringIO())
+        call_command('recalculate_order_totals', stdout=StringIO())
+
+        order.refresh_from_db()
+        self.assertEqual((order.total_price, order.items_count), (500, 5))
+        call_command('recalculate_order_totals', '--check', stdout=StringIO())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CartQuoteApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        menu_index.reset()
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Ресторанная, {number}')
+            for number in range(2)
+        ]
+        self.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100 + number, image='burger.jpg')
+            for number in range(2)
+        ]
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[0], product=self.products[0])
+        RestaurantMenuItem.objects.create(restaurant=self.restaurants[1], product=self.products[1])
+
+    def quote(self, *lines):
+        return self.client.post(
+            '/api/cart/quote/',
+            {'products': [{'product': product.id, 'quantity': quantity} for product, quantity in lines]},
+            content_type='application/json',
+        )
+
+    def test_quote(self):
+        response = self.quote((self.products[0], 2), (self.products[1], 1))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'lines': [
+                {'product': self.products[0].id, 'quantity': 2, 'price': '100.00', 'total': '200.00'},
+                {'product': self.products[1].id, 'quantity': 1, 'price': '101.00', 'total': '101.00'},
+            ],
+            'total': '301.00',
+            'can_be_fulfilled': False,
+        })
+        self.assertTrue(self.quote((self.products[0], 1)).json()['can_be_fulfilled'])
+
+    def test_quote_is_cached_until_menu_changes(self):
+        self.quote((self.products[0], 1), (self.products[1], 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.quote((self.products[1], 3), (self.products[0], 1))
+        self.assertEqual(len(queries), 0)
+        self.assertFalse(response.json()['can_be_fulfilled'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.create(restaurant=self.restaurants[0], product=self.products[1])
+        self.assertTrue(self.quote((self.products[0], 1), (self.products[1], 1)).json()['can_be_fulfilled'])
+
+    def test_fulfillment_is_read_from_database(self):
+        menu_index.get_restaurant_ids([self.products[0].id])
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=self.restaurants[0], product=self.products[1]),
+        ])
+
+        self.assertTrue(self.quote((self.products[0], 1), (self.products[1], 1)).json()['can_be_fulfilled'])
+        self.assertEqual(menu_index.get_restaurant_ids([self.products[0].id, self.products[1].id]), [])
+
+    def test_unknown_products(self):
+        response = self.client.post(
+            '/api/cart/quote/',
+            {'products': [{'product': self.products[0].id, 'quantity': 1}, {'product': 1000, 'quantity': 1}]},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['products'][0], {})
+        self.assertIn('1000', response.json()['products'][1]['product'][0])
+
+
+class AssignRestaurantsTest(SimpleTestCase):
+    def test_nearest_restaurants_are_assigned(self):
+        candidates = [(1, 10, 5.0), (1, 11, 2.0), (2, 10, 1.0), (2, 11, 3.0)]
+
+        self.assertEqual(assign_restaurants(candidates, {}), {1: 11, 2: 10})
+
+    def test_capacity_limits(self):
+        candidates = [(1, 10, 1.0), (2, 10, 2.0), (3, 10, 3.0), (3, 11, 9.0), (4, 11, 1.0)]
+
+        self.assertEqual(assign_restaurants(candidates, {10: 2, 11: 1}), {1: 10, 2: 10, 4: 11})
+        self.assertEqual(assign_restaurants(candidates, {10: 2}, default_capacity=2), {1: 10, 2: 10, 3: 11, 4: 11})
+        self.assertEqual(assign_restaurants(candidates, {10: 0}, default_capacity=1), {4: 11})
+
+    def test_distance_ties_are_broken_by_ids(self):
+        self.assertEqual(assign_restaurants([(2, 10, 1.0), (1, 10, 1.0)], {10: 1}), {1: 10})
+        self.assertEqual(assign_restaurants([(1, 11, 1.0), (1, 10, 1.0)], {}), {1: 10})
+
+    def test_unknown_distances_go_last(self):
+        self.assertEqual(assign_restaurants([(1, 10, None), (1, 11, 30.0)], {}), {1: 11})
+        self.assertEqual(assign_restaurants([(1, 10, None)], {}), {1: 10})
+
+    def test_orders_without_free_candidates_are_left(self):
+        candidates = [(1, 10, 1.0), (2, 10, 2.0)]
+
+        self.assertEqual(assign_restaurants(candidates, {10: 1}), {1: 10})
+        self.assertEqual(assign_restaurants([], {}), {})
+
+
+class DispatchOrdersTest(TestCase):
+    def setUp(self):
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Ресторанная, {number}')
+            for number in range(2)
+        ]
+        self.orders = [
+            Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79001234567', address='Тверская, 1')
+            for _ in range(3)
+        ]
+        distances = [[1.0, 5.0], [2.0, 3.0], [3.0, None]]
+        for order, order_distances in zip(self.orders, distances):
+            for restaurant, distance in zip(self.restaurants, order_distances):
+                OrderCandidateRestaurant.objects.create(order=order, restaurant=restaurant, distance=distance)
+
+    def get_processing_restaurants(self):
+        return [
+            Order.objects.get(pk=order.pk).processing_restaurant
+            for order in self.orders
+        ]
+
+    def test_assignment_is_saved(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        started_at = timezone.now()
+
+        assignment = dispatch_orders(capacity=2)
+
+        self.assertEqual(assignment, {
+            self.orders[0].id: self.restaurants[0].id,
+            self.orders[1].id: self.restaurants[0].id,
+            self.orders[2].id: self.restaurants[1].id,
+        })
+        self.assertEqual(self.get_processing_restaurants(), [self.restaurants[0], self.restaurants[0], self.restaurants[1]])
+        orders = Order.objects.filter(pk__in=[order.pk for order in self.orders])
+        self.assertEqual(set(orders.values_list('status', flat=True)), {Order.COOKING_STATUS})
+        self.assertTrue(all(order.updated_at >= started_at for order in orders))
+
+    def test_busy_restaurants_and_dry_run(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(
+            status=Order.COOKING_STATUS,
+            processing_restaurant=self.restaurants[0],
+        )
+
+        assignment = dispatch_orders(capacity=1, dry_run=True)
+
+        self.assertEqual(assignment, {self.orders[1].id: self.restaurants[1].id})
+        self.assertEqual(self.get_processing_restaurants(), [self.restaurants[0], None, None])
+
+    @override_settings(RESTAURANT_ORDERS_CAPACITY=None)
+    def test_admin_action(self):
+        admin = get_user_model().objects.create_superuser('admin', password='password')
+        self.client.force_login(admin)
+
+        response = self.client.post('/admin/foodcartapp/order/', {
+            'action': 'dispatch_selected_orders',
+            '_selected_action': [self.orders[1].pk, self.orders[2].pk],
+        }, follow=True)
+
+        self.assertContains(response, 'Назначено ресторанов: 2')
+        self.assertEqual(self.get_processing_restaurants(), [None, self.restaurants[0], self.restaurants[0]])
+
+
+class GeocodeBackfillCommandTest(TestCase):
+    def setUp(self):
+        menu_index.reset()
+        self.restaurant = Restaurant.objects.create(name='Ресторан', address='Тверская, 1')
+        Restaurant.objects.create(name='Новый ресторан', address='Тверская, 3')
+        product = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        RestaurantMenuItem.objects.create(restaurant=self.restaurant, product=product)
+        Location.objects.create(address='Тверская, 1', latitude=55.76, longitude=37.61)
+        Location.objects.create(address='Ленина, 5', latitude=55.70, longitude=37.60)
+
+        self.orders = []
+        for address in ['Арбат, 1', 'арбат д. 1', 'Ленина, 5', 'Нигде']:
+            order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79001234567', address=address)
+            OrderItem.objects.create(order=order, product=product, product_price=100)
+            self.orders.append(order)
+        refresh_order_candidates(Order.objects.all())
+        OrderCandidateRestaurant.objects.filter(order=self.orders[2]).update(distance=99)
+
+    def test_backfill(self):
+        coordinates = {'Арбат, 1': ('37.59', '55.75'), 'Тверская, 3': ('37.62', '55.77'), 'Нигде': None}
+        geocoder = mock.Mock()
+        geocoder.fetch_coordinates.side_effect = coordinates.get
+
+        with mock.patch('foodcartapp.management.commands.geocode_backfill.get_geocoder', return_value=geocoder), \
+                mock.patch('foodcartapp.management.commands.geocode_backfill.TokenBucket', wraps=TokenBucket) as bucket, \
+                mock.patch.object(TokenBucket, 'acquire', autospec=True) as acquire:
+            call_command('geocode_backfill', '--rate', '5', '--workers', '2', stdout=StringIO())
+
+        self.assertEqual(
+            sorted(call.args[0] for call in geocoder.fetch_coordinates.call_args_list),
+            sorted(coordinates),
+        )
+        bucket.assert_called_once_with(5.0)
+        self.assertEqual(acquire.call_count, 3)
+
+        location = Location.objects.get(address='Арбат, 1')
+        self.assertEqual(location.address_key, 'арбат 1')
+        self.assertEqual(location.geohash, geohash.encode(55.75, 37.59))
+        self.assertEqual(Location.objects.count(), 4)
+
+        distances = dict(OrderCandidateRestaurant.objects.values_list('order_id', 'distance'))
+        self.assertIsNotNone(distances[self.orders[0].id])
+        self.assertEqual(distances[self.orders[0].id], distances[self.orders[1].id])
+        self.assertEqual(distances[self.orders[2].id], 99)
+        self.assertIsNone(distances[self.orders[3].id])
+
+
+class RestaurantAdminTest(TestCase):
+    @mock.patch('locations.models.fetch_coordinates', return_value=('37.61', '55.76'))
+    def test_address_is_geocoded_after_commit(self, fetch_coordinates):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', password='password'))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/admin/foodcartapp/restaurant/add/', {
+                'name': 'Ресторан',
+                'address': 'Тверская, 1',
+                'contact_phone': '',
+                'menu_items-TOTAL_FORMS': 0,
+                'menu_items-INITIAL_FORMS': 0,
+            })
+        self.assertEqual(response.status_code, 302)
+        fetch_coordinates.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        fetch_coordinates.assert_called_once_with('Тверская, 1')
+        self.assertEqual(Location.objects.get().address_key, Restaurant.objects.get().address_key)
+
+
+class OrderAdminTest(TestCase):
+    def setUp(self):
+        category = ProductCategory.objects.create(name='Бургеры')
+        self.products = [
+            Product.objects.create(name=f'Бургер {number}', category=category, price=100 * number, image='burger.jpg')
+            for number in range(1, 4)
+        ]
+        self.order = Order.objects.create(
+            firstname='Иван',
+            lastname='Иванов',
+            phonenumber='+79001234567',
+            address='Тверская, 1',
+        )
+        self.items = [
+            OrderItem.objects.create(order=self.order, product=product, quantity=1, product_price=product.price)
+            for product in self.products[:2]
+        ]
+        self.order.update_totals()
+        self.client.force_login(get_user_model().objects.create_superuser('admin', password='password'))
+
+    def test_totals_follow_inline_items(self):
+        response = self.client.post(f'/admin/foodcartapp/order/{self.order.id}/change/', {
+            'firstname': 'Иван',
+            'lastname': 'Иванов',
+            'phonenumber': '+79001234567',
+            'address': 'Тверская, 1',
+            'status': Order.PROCESS_STATUS,
+            'payment_type': '',
+            'comment': '',
+            'processing_restaurant': '',
+            'items-TOTAL_FORMS': 3,
+            'items-INITIAL_FORMS': 2,
+            'items-0-id': self.items[0].id,
+            'items-0-order': self.order.id,
+            'items-0-product': self.products[0].id,
+            'items-0-quantity': 4,
+            'items-0-product_price': 100,
+            'items-1-id': self.items[1].id,
+            'items-1-order': self.order.id,
+            'items-1-product': self.products[1].id,
+            'items-1-quantity': 1,
+            'items-1-product_price': 200,
+            'items-1-DELETE': 'on',
+            'items-2-order': self.order.id,
+            'items-2-product': self.products[2].id,
+            'items-2-quantity': 2,
+            'items-2-product_price': 300,
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.items.count(), 2)
+        self.assertEqual((self.order.total_price, self.order.items_count), (1000, 6))
@@ -1,6 +1,14 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (
+    banners_list_api,
+    product_list_api,
+    quote_cart,
+    register_order,
+    register_orders_batch,
+    restaurant_list_api,
+    restaurant_menu_api,
+)
 
 
 app_name = "foodcartapp"
@@ -9,4 +17,8 @@ urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
     path('order/', register_order),
+    path('cart/quote/', quote_cart),
+    path('orders/batch/', register_orders_batch),
+    path('restaurants/', restaurant_list_api),
+    path('restaurants/<int:restaurant_id>/menu/', restaurant_menu_api),
 ]
@@ -1,19 +1,32 @@
+import hashlib
+from functools import lru_cache
+
 from django.http import JsonResponse
 from django.templatetags.static import static
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 
 from locations.models import Location
-from .helpers.restaurant_helpers import get_available_restaurants
-from .models import Order, OrderItem, Product
-from .serializers import OrderSerializer
+from locations.services.addresses import normalize_address
+from .helpers.candidate_helpers import refresh_order_candidates
+from .helpers.cart_helpers import get_cart_quote
+from .helpers.catalog_helpers import get_catalog, get_catalog_version, get_products_values, query_catalog
+from .helpers.idempotency_helpers import idempotent
+from .helpers.restaurant_helpers import find_restaurant_ids, get_available_restaurant_ids, menu_index
+from .helpers.snapshot_helpers import build_snapshot, choose_encoding, snapshot_response
+from .models import Order, OrderItem, Product, Restaurant
+from .serializers import CartSerializer, OrderSerializer, ProductQuerySerializer, ProductsSerializer
 
 
-def banners_list_api(request):
+@lru_cache(maxsize=None)
+def get_banners():
     # FIXME move data to db?
-    return JsonResponse([
+    return build_snapshot([
         {
             'title': 'Burger',
             'src': static('burger.jpg'),
@@ -29,21 +42,22 @@ def banners_list_api(request):
             'src': static('tasty.jpg'),
             'text': 'Food is incomplete without a tasty dessert',
         }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    ])
+
+
+def banners_list_api(request):
+    return snapshot_response(get_banners(), choose_encoding(request))
 
 
 @api_view(['POST'])
 @transaction.atomic
+@idempotent
 def register_order(request):
     serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
 
     product_ids = list(map(lambda order_item: order_item['product'].id, serializer.validated_data['products']))
-    available_restaurants = get_available_restaurants(product_ids)
-    if not available_restaurants:
+    if not get_available_restaurant_ids(product_ids):
         return Response(
             {'message': 'Не найдены рестораны, способные обработать данный заказ.'},
             status=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -56,7 +70,7 @@ def register_order(request):
         address=serializer.validated_data['address'],
     )
 
-    Location.create_location_by_address(serializer.validated_data['address'])
+    Location.request_location_by_address(serializer.validated_data['address'])
 
     products_fields = serializer.validated_data['products']
     order_items = []
@@ -71,34 +85,185 @@ def register_order(request):
             )
         )
 
+    order.set_totals(order_items)
     order.save()
     OrderItem.objects.bulk_create(order_items)
+    refresh_order_candidates(Order.objects.filter(pk=order.pk))
     return Response(serializer.data)
 
 
+ORDERS_BATCH_MAX_SIZE = 1000
+
+
+def get_payload_product_ids(orders_payload):
+    product_field = ProductsSerializer().fields['product']
+    product_ids = set()
+    for order_payload in orders_payload:
+        products = order_payload.get('products') if isinstance(order_payload, dict) else None
+        if not isinstance(products, list):
+            continue
+        for product_payload in products:
+            if isinstance(product_payload, dict):
+                try:
+                    product_ids.add(product_field.run_validation(product_payload.get('product')))
+                except ValidationError:
+                    pass
+    return product_ids
+
+
+def save_orders(orders):
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+    else:
+        for order in orders:
+            order.save()
+
+
+@api_view(['POST'])
+@transaction.atomic
+@idempotent
+def register_orders_batch(request):
+    """Register an array of orders, each validated on its own.
+
+    Responds with 200 if all of them are created, 207 if some failed and 422 if all did.
+    """
+    orders_payload = request.data
+    if not isinstance(orders_payload, list) or not orders_payload:
+        return Response({'message': 'Ожидается непустой список заказов.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(orders_payload) > ORDERS_BATCH_MAX_SIZE:
+        return Response(
+            {'message': f'В одном запросе можно передать не больше {ORDERS_BATCH_MAX_SIZE} заказов.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    products_by_ids = Product.objects.in_bulk(get_payload_product_ids(orders_payload))
+    menu_bitsets = menu_index.get_bitsets()
+    results = []
+    orders_and_items = []
+    for index, order_payload in enumerate(orders_payload):
+        serializer = OrderSerializer(data=order_payload, context={'products_by_ids': products_by_ids})
+        if not serializer.is_valid():
+            results.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+            continue
+
+        products_fields = serializer.validated_data['products']
+        product_ids = [product_fields['product'].id for product_fields in products_fields]
+        if not find_restaurant_ids(menu_bitsets, product_ids):
+            results.append({
+                'index': index,
+                'status': 'error',
+                'errors': {'message': 'Не найдены рестораны, способные обработать данный заказ.'},
+            })
+            continue
+
+        order = Order(
+            firstname=serializer.validated_data['firstname'],
+            lastname=serializer.validated_data['lastname'],
+            phonenumber=serializer.validated_data['phonenumber'],
+            address=serializer.validated_data['address'],
+            address_key=normalize_address(serializer.validated_data['address']),
+        )
+        order_items = [
+            OrderItem(
+                product=product_fields['product'],
+                order=order,
+                quantity=product_fields['quantity'],
+                product_price=product_fields['product'].price,
+            )
+            for product_fields in products_fields
+        ]
+        order.set_totals(order_items)
+        result = {'index': index, 'status': 'created'}
+        results.append(result)
+        orders_and_items.append((order, order_items, result))
+
+    if orders_and_items:
+        orders = [order for order, _, _ in orders_and_items]
+        save_orders(orders)
+        order_items = []
+        for order, items, result in orders_and_items:
+            result['id'] = order.id
+            for order_item in items:
+                order_item.order = order
+            order_items.extend(items)
+        OrderItem.objects.bulk_create(order_items)
+
+        Location.request_locations_by_addresses({order.address for order in orders})
+        refresh_order_candidates(Order.objects.filter(pk__in=[order.id for order in orders]))
+
+    if not orders_and_items:
+        return Response(results, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    has_errors = len(orders_and_items) < len(orders_payload)
+    return Response(results, status=status.HTTP_207_MULTI_STATUS if has_errors else status.HTTP_200_OK)
+
+
+def get_catalog_etag(request):
+    request.catalog_version = get_catalog_version()
+    if request.GET:
+        query = sorted(request.GET.items())
+        return f'{request.catalog_version}-{hashlib.md5(repr(query).encode()).hexdigest()}'
+
+    request.catalog_encoding = choose_encoding(request)
+    return f'{request.catalog_version}-{request.catalog_encoding}'
+
+
+def get_products_page_response(request):
+    serializer = ProductQuerySerializer(data=request.GET.dict())
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400, json_dumps_params={'ensure_ascii': False})
+
+    products, next_cursor = query_catalog(**serializer.validated_data)
+    response = JsonResponse(products, safe=False, json_dumps_params={
+        'ensure_ascii': False,
+        'separators': (',', ':'),
+    })
+    if next_cursor is not None:
+        next_page_query = request.GET.copy()
+        next_page_query['cursor'] = next_cursor
+        response['Link'] = f'<{request.path}?{next_page_query.urlencode()}>; rel="next"'
+    return response
+
+
+@condition(etag_func=get_catalog_etag)
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
+    """Available products: the catalog snapshot, or a filtered page if there are query parameters."""
+    if request.GET:
+        response = get_products_page_response(request)
+    else:
+        response = snapshot_response(get_catalog(request.catalog_version), request.catalog_encoding)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def restaurant_list_api(request):
+    menu_sizes = menu_index.count_products()
+    restaurants = Restaurant.objects.order_by('id').values('id', 'name', 'address', 'contact_phone')
+    return JsonResponse([
+        {**restaurant, 'menu_count': menu_sizes.get(restaurant['id'], 0)}
+        for restaurant in restaurants
+    ], safe=False, json_dumps_params={
         'ensure_ascii': False,
-        'indent': 4,
+        'separators': (',', ':'),
     })
+
+
+def restaurant_menu_api(request, restaurant_id):
+    restaurant = Restaurant.objects.filter(pk=restaurant_id).values('id', 'name').first()
+    if restaurant is None:
+        return JsonResponse({'message': 'Ресторан не найден.'}, status=404, json_dumps_params={'ensure_ascii': False})
+
+    return JsonResponse({
+        **restaurant,
+        'products': get_products_values(menu_index.get_product_ids(restaurant_id)),
+    }, json_dumps_params={
+        'ensure_ascii': False,
+        'separators': (',', ':'),
+    })
+
+
+@api_view(['POST'])
+def quote_cart(request):
+    """Prices of the cart and whether any restaurant can make it; nothing is saved."""
+    serializer = CartSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return Response(get_cart_quote(**serializer.validated_data))
@@ -0,0 +1,68 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from geopy import distance
+
+from locations.services.distances import get_distance_matrix
+
+
+def get_random_points(count, center=(55.751244, 37.618423), spread=0.3):
+    return [
+        (center[0] + random.uniform(-spread, spread), center[1] + random.uniform(-spread, spread))
+        for _ in range(count)
+    ]
+
+
+def get_sorted_distances_with_geopy(origins, destinations):
+    sorted_distances = []
+    for origin in origins:
+        distances = [
+            (index, distance.distance(origin, destination).km)
+            for index, destination in enumerate(destinations)
+        ]
+        sorted_distances.append(sorted(distances, key=lambda index_and_distance: index_and_distance[1]))
+    return sorted_distances
+
+
+def get_sorted_distances(origins, destinations):
+    """Destinations of every origin as `(index, distance in km)` pairs sorted by distance."""
+    matrix = get_distance_matrix(origins, destinations)
+    order = np.argsort(matrix, axis=1, kind='stable')
+    return [
+        [(int(index), float(row[index])) for index in row_order]
+        for row, row_order in zip(matrix, order)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость расчёта матрицы расстояний через geopy и NumPy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--restaurants', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        origins = get_random_points(options['orders'])
+        destinations = get_random_points(options['restaurants'])
+
+        started_at = time.perf_counter()
+        geopy_result = get_sorted_distances_with_geopy(origins, destinations)
+        geopy_time = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        numpy_result = get_sorted_distances(origins, destinations)
+        numpy_time = time.perf_counter() - started_at
+
+        max_error = max(
+            abs(geopy_distance - numpy_distance) / geopy_distance
+            for geopy_row, numpy_row in zip(geopy_result, numpy_result)
+            for (_, geopy_distance), (_, numpy_distance) in zip(sorted(geopy_row), sorted(numpy_row))
+        )
+        self.stdout.write(f'Пар: {len(origins) * len(destinations)}')
+        self.stdout.write(f'geopy: {geopy_time * 1000:.1f} мс')
+        self.stdout.write(f'numpy: {numpy_time * 1000:.1f} мс (x{geopy_time / numpy_time:.0f})')
+        self.stdout.write(f'Максимальное относительное расхождение: {max_error:.3%}')
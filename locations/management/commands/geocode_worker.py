@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from locations.models import GeocodingJob
+from locations.services.geocoder_client import geocoder_client
+
+
+class Command(BaseCommand):
+    help = 'Определяет координаты адресов из очереди задач геокодирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=1, help='пауза в секундах, когда очередь пуста')
+        parser.add_argument('--once', action='store_true', help='обработать очередь и выйти')
+
+    def handle(self, *args, **options):
+        while True:
+            jobs = GeocodingJob.claim(options['batch_size'])
+            for job in jobs:
+                job.run()
+                self.stdout.write(f'{job.address}: {job.get_status_display()} {job.last_error}'.rstrip())
+            if jobs:
+                self.stdout.write(f'Геокодер: {geocoder_client.metrics.snapshot()}')
+
+            if not jobs:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+from locations.services import geohash
+
+
+def fill_geohashes(apps, schema_editor):
+    Location = apps.get_model('locations', 'Location')
+    locations = list(Location.objects.all())
+    for location in locations:
+        location.geohash = geohash.encode(location.latitude, location.longitude)
+    Location.objects.bulk_update(locations, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_auto_20221228_1819'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, verbose_name='геохеш'),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
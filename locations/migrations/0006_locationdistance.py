@@ -0,0 +1,28 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0005_location_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationDistance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField(verbose_name='расстояние, км')),
+                ('from_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='locations.location', verbose_name='откуда')),
+                ('to_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='locations.location', verbose_name='куда')),
+            ],
+            options={
+                'verbose_name': 'расстояние',
+                'verbose_name_plural': 'расстояния',
+                'unique_together': {('from_location', 'to_location')},
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:38
+
+import re
+
+from django.db import migrations, models
+
+
+STREET_TYPES = {
+    'улица': 'ул',
+    'ул': 'ул',
+    'проспект': 'пр-кт',
+    'просп': 'пр-кт',
+    'пр-т': 'пр-кт',
+    'пр-кт': 'пр-кт',
+    'переулок': 'пер',
+    'пер': 'пер',
+    'площадь': 'пл',
+    'пл': 'пл',
+    'шоссе': 'ш',
+    'ш': 'ш',
+    'бульвар': 'б-р',
+    'бул': 'б-р',
+    'б-р': 'б-р',
+    'набережная': 'наб',
+    'наб': 'наб',
+    'проезд': 'пр-д',
+    'пр-д': 'пр-д',
+    'тупик': 'туп',
+    'туп': 'туп',
+    'аллея': 'ал',
+    'ал': 'ал',
+    'микрорайон': 'мкр',
+    'мкр': 'мкр',
+}
+
+ABBREVIATIONS = {
+    'город': 'г',
+    'корпус': 'к',
+    'корп': 'к',
+    'строение': 'стр',
+    'квартира': 'кв',
+}
+
+HOUSE_MARKERS = {'дом', 'д'}
+
+PUNCTUATION_PATTERN = re.compile(r'[.,;:!?"\'«»()\[\]№#]+')
+
+
+def normalize_address(address):
+    """Copy of `locations.services.addresses.normalize_address` as of this migration."""
+    address = PUNCTUATION_PATTERN.sub(' ', address.casefold().replace('ё', 'е'))
+
+    words = []
+    street_types = []
+    for word in address.split():
+        if word in STREET_TYPES:
+            street_types.append(STREET_TYPES[word])
+        elif word not in HOUSE_MARKERS:
+            words.append(ABBREVIATIONS.get(word, word))
+    return ' '.join([*words, *sorted(street_types)])
+
+
+BATCH_SIZE = 1000
+
+
+def fill_model_address_keys(model):
+    last_id = 0
+    while True:
+        objects = list(model.objects.filter(id__gt=last_id).order_by('id').only('id', 'address')[:BATCH_SIZE])
+        if not objects:
+            return
+        for obj in objects:
+            obj.address_key = normalize_address(obj.address)
+        model.objects.bulk_update(objects, ['address_key'])
+        last_id = objects[-1].id
+
+
+def fill_address_keys(apps, schema_editor):
+    fill_model_address_keys(apps.get_model('locations', 'Location'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0007_auto_20261018_0533'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='address_key',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='ключ адреса'),
+        ),
+        migrations.RunPython(fill_address_keys, migrations.RunPython.noop),
+    ]
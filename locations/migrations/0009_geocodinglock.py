@@ -0,0 +1,25 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0008_location_address_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodingLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address_key', models.CharField(max_length=255, unique=True, verbose_name='ключ адреса')),
+                ('expires_at', models.DateTimeField(verbose_name='действует до')),
+            ],
+            options={
+                'verbose_name': 'блокировка геокодирования',
+                'verbose_name_plural': 'блокировки геокодирования',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0010_refill_address_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geocodinglock',
+            name='owner',
+            field=models.CharField(blank=True, max_length=32, verbose_name='владелец'),
+        ),
+    ]
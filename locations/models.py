@@ -1,14 +1,92 @@
-from django.db import models
+import math
+import random
+import time
+from datetime import timedelta
+from functools import partial
+from uuid import uuid4
 
+import requests
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from locations.services import geohash
+from locations.services.addresses import normalize_address
+from locations.services.cache import LRUCache
+from locations.services.distances import get_distance_matrix
 from locations.services.geocoder import fetch_coordinates
+from locations.services.geocoder_client import geocoder_client
+from locations.services.single_flight import SingleFlight
+
+
+geocoder_cache = LRUCache(maxsize=10_000)
+geocoding_flight = SingleFlight()
+
+
+class LocationQuerySet(models.QuerySet):
+    def near(self, points, max_km):
+        """Locations in the geohash cells around the points; may include farther ones, never misses closer."""
+        cells = set()
+        for latitude, longitude in points:
+            covering_cells = geohash.get_covering_cells(latitude, longitude, max_km)
+            if not covering_cells:
+                return self
+            cells |= covering_cells
+
+        if not cells:
+            return self.none()
+
+        cells_filter = models.Q()
+        for cell in cells:
+            cells_filter |= models.Q(geohash__startswith=cell)
+        return self.filter(cells_filter)
+
+    def nearest(self, point, k=None, max_km=None):
+        """Up to `k` locations closest to the point as `(location, km)` pairs."""
+        locations = list(self if max_km is None else self.near([point], max_km))
+        if not locations:
+            return []
+
+        distances = get_distance_matrix(
+            [point],
+            [(location.latitude, location.longitude) for location in locations],
+        )[0]
+        locations_and_distances = sorted(
+            (
+                (location, float(distance_between))
+                for location, distance_between in zip(locations, distances)
+                if max_km is None or distance_between <= max_km
+            ),
+            key=lambda location_and_distance: location_and_distance[1],
+        )
+        return locations_and_distances[:k]
+
+    def by_addresses(self, addresses):
+        """Locations of the addresses matched by their canonical keys."""
+        keys_by_addresses = {address: normalize_address(address) for address in set(addresses)}
+        locations = (
+            self
+            .filter(address_key__in=set(keys_by_addresses.values()))
+            .order_by('last_request_to_geocoder')
+        )
+        locations_by_keys = {location.address_key: location for location in locations}
+        return {
+            address: locations_by_keys[key]
+            for address, key in keys_by_addresses.items()
+            if key in locations_by_keys
+        }
 
 
 class Location(models.Model):
     address = models.CharField('адрес', max_length=255, unique=True)
     longitude = models.FloatField('долгота')
     latitude = models.FloatField('широта')
+    address_key = models.CharField('ключ адреса', max_length=255, blank=True, db_index=True)
+    geohash = models.CharField('геохеш', max_length=12, blank=True, db_index=True)
     last_request_to_geocoder = models.DateTimeField('дата запроса координат', auto_now_add=True)
 
+    objects = LocationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'локация'
         verbose_name_plural = 'локации'
@@ -16,25 +94,290 @@ class Location(models.Model):
     def __str__(self):
         return self.address
 
+    def save(self, *args, **kwargs):
+        self.address_key = normalize_address(self.address)
+        self.geohash = geohash.encode(float(self.latitude), float(self.longitude))
+        super().save(*args, **kwargs)
+
+    def is_fresh(self):
+        ttl = timedelta(seconds=settings.GEOCODER_CACHE_TTL_SECONDS)
+        return self.last_request_to_geocoder + ttl > timezone.now()
+
     @classmethod
     def create_location_by_address(cls, address):
-        coords = fetch_coordinates(address)
-        if coords is not None:
-            longitude, latitude = coords
-            location, created = Location.objects.get_or_create(
-                address=address,
-                defaults={
-                    'longitude': longitude,
-                    'latitude': latitude,
-                }
-            )
+        """Location of the address from a fresh row, the process cache or the geocoder.
+
+        Call it outside of a transaction, so that other processes see its `GeocodingLock`.
+        """
+        location = cls.get_location_or_none(address)
+        if location is not None and location.is_fresh():
             return location
-        return None
+
+        address_key = normalize_address(address)
+        return geocoding_flight.do(address_key, partial(cls._locate_exclusively, address, address_key))
 
     @classmethod
-    def get_location_or_none(cls, address):
+    def _locate_exclusively(cls, address, address_key):
+        """Geocode the address holding its `GeocodingLock`, or wait up to `WAIT_SECONDS` for the holder's result."""
+        owner = GeocodingLock.acquire(address_key)
+        deadline = time.monotonic() + GeocodingLock.WAIT_SECONDS
+        while owner is None and time.monotonic() < deadline:
+            time.sleep(GeocodingLock.POLL_SECONDS)
+            location = cls.get_location_or_none(address)
+            if location is not None and location.is_fresh():
+                return location
+            owner = GeocodingLock.acquire(address_key)
+
         try:
-            location = cls.objects.get(address=address)
-        except cls.DoesNotExist:
-            location = None
+            return cls._locate(address, address_key)
+        finally:
+            if owner is not None:
+                GeocodingLock.release(address_key, owner)
+
+    @classmethod
+    def _locate(cls, address, address_key):
+        location = cls.get_location_or_none(address)
+        if location is not None and location.is_fresh():
+            return location
+
+        now = timezone.now()
+        cached_coords, expires_at = geocoder_cache.get(address_key, (None, None))
+        if expires_at is not None and expires_at > now:
+            coords = cached_coords
+        else:
+            try:
+                coords = fetch_coordinates(address)
+            except requests.RequestException:
+                if location is None:
+                    raise
+                return location
+            ttl = settings.GEOCODER_CACHE_TTL_SECONDS if coords else settings.GEOCODER_NEGATIVE_CACHE_TTL_SECONDS
+            geocoder_cache.set(address_key, (coords, now + timedelta(seconds=ttl)))
+
+        if coords is None:
+            return location
+
+        longitude, latitude = map(float, coords)
+        if location is not None:
+            location.longitude = longitude
+            location.latitude = latitude
+            location.last_request_to_geocoder = now
+            location.save()
+            return location
+
+        location, created = cls.objects.update_or_create(
+            address=address,
+            defaults={
+                'longitude': longitude,
+                'latitude': latitude,
+                'last_request_to_geocoder': now,
+            }
+        )
+        return location
+
+    @classmethod
+    def locate_or_defer(cls, address):
+        """Geocode the address right away; if the geocoder fails, do it in background."""
+        try:
+            return cls.create_location_by_address(address)
+        except requests.RequestException:
+            GeocodingJob.enqueue(address)
+            return cls.get_location_or_none(address)
+
+    @classmethod
+    def request_location_by_address(cls, address):
+        """Known location of the address; unknown or stale ones are geocoded in background."""
+        location = cls.get_location_or_none(address)
+        if location is None or not location.is_fresh():
+            GeocodingJob.enqueue(address)
         return location
+
+    @classmethod
+    def request_locations_by_addresses(cls, addresses):
+        """Known locations of the addresses; unknown or stale ones are geocoded in background."""
+        locations_by_addresses = cls.objects.by_addresses(addresses)
+        GeocodingJob.enqueue_many(
+            address for address in set(addresses)
+            if address not in locations_by_addresses or not locations_by_addresses[address].is_fresh()
+        )
+        return locations_by_addresses
+
+    @classmethod
+    def get_location_or_none(cls, address):
+        return (
+            cls.objects
+            .filter(address_key=normalize_address(address))
+            .order_by('-last_request_to_geocoder')
+            .first()
+        )
+
+
+class LocationDistance(models.Model):
+    from_location = models.ForeignKey(
+        Location,
+        verbose_name='откуда',
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    to_location = models.ForeignKey(
+        Location,
+        verbose_name='куда',
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    distance = models.FloatField('расстояние, км')
+
+    class Meta:
+        verbose_name = 'расстояние'
+        verbose_name_plural = 'расстояния'
+        unique_together = [
+            ['from_location', 'to_location']
+        ]
+
+    def __str__(self):
+        return f'{self.from_location_id} - {self.to_location_id}'
+
+
+class GeocodingJob(models.Model):
+    PENDING_STATUS = 'PENDING'
+    DONE_STATUS = 'DONE'
+    FAILED_STATUS = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING_STATUS, 'Ожидает'),
+        (DONE_STATUS, 'Выполнено'),
+        (FAILED_STATUS, 'Ошибка'),
+    ]
+
+    MAX_ATTEMPTS = 8
+    RETRY_DELAY_SECONDS = 30
+    LEASE_SECONDS = 60
+
+    address = models.CharField('адрес', max_length=255, unique=True)
+    status = models.CharField('статус', max_length=7, choices=STATUS_CHOICES, default=PENDING_STATUS)
+    attempts = models.PositiveSmallIntegerField('попыток', default=0)
+    next_attempt_at = models.DateTimeField('следующая попытка', default=timezone.now)
+    last_error = models.TextField('последняя ошибка', blank=True)
+    created_at = models.DateTimeField('создано', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'задача геокодирования'
+        verbose_name_plural = 'задачи геокодирования'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return self.address
+
+    @classmethod
+    def enqueue(cls, address):
+        job, created = cls.objects.get_or_create(address=address)
+        if not created and job.status != cls.PENDING_STATUS:
+            cls.objects.filter(pk=job.pk).update(
+                status=cls.PENDING_STATUS,
+                attempts=0,
+                next_attempt_at=timezone.now(),
+                last_error='',
+            )
+        return job
+
+    @classmethod
+    def enqueue_many(cls, addresses):
+        addresses = set(addresses)
+        now = timezone.now()
+        cls.objects.filter(address__in=addresses).exclude(status=cls.PENDING_STATUS).update(
+            status=cls.PENDING_STATUS,
+            attempts=0,
+            next_attempt_at=now,
+            last_error='',
+        )
+        cls.objects.bulk_create(
+            [cls(address=address, next_attempt_at=now) for address in addresses],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def claim(cls, batch_size):
+        """Take due jobs for `LEASE_SECONDS` so that other workers skip them."""
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                cls.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=cls.PENDING_STATUS, next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:batch_size]
+            )
+            cls.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                next_attempt_at=now + timedelta(seconds=cls.LEASE_SECONDS)
+            )
+        return jobs
+
+    def finish(self, status, error=''):
+        self.status = status
+        self.last_error = error
+        self.save(update_fields=['status', 'last_error'])
+
+    def retry_later(self, error):
+        self.attempts += 1
+        self.last_error = error
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = self.FAILED_STATUS
+        else:
+            delay = self.RETRY_DELAY_SECONDS * 2 ** (self.attempts - 1)
+            self.next_attempt_at = timezone.now() + timedelta(seconds=delay * random.uniform(1, 1.5))
+        self.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+    def run(self):
+        try:
+            location = Location.create_location_by_address(self.address)
+        except requests.RequestException as error:
+            self.retry_later(str(error))
+            return
+        if location is None:
+            self.finish(self.FAILED_STATUS, 'Адрес не найден')
+        else:
+            self.finish(self.DONE_STATUS)
+
+
+class GeocodingLock(models.Model):
+    """Claim of an address being geocoded by some process right now."""
+
+    # The lease outlives the slowest geocoder call, so a live lock is never taken over.
+    LEASE_SECONDS = math.ceil(geocoder_client.max_duration) + 10
+    WAIT_SECONDS = 5
+    POLL_SECONDS = 0.1
+
+    address_key = models.CharField('ключ адреса', max_length=255, unique=True)
+    owner = models.CharField('владелец', max_length=32, blank=True)
+    expires_at = models.DateTimeField('действует до')
+
+    class Meta:
+        verbose_name = 'блокировка геокодирования'
+        verbose_name_plural = 'блокировки геокодирования'
+
+    def __str__(self):
+        return self.address_key
+
+    @classmethod
+    def acquire(cls, address_key):
+        """Take the lock and return the owner token, or `None` if it is held and the lease has not expired."""
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=cls.LEASE_SECONDS)
+        owner = uuid4().hex
+        try:
+            with transaction.atomic():
+                cls.objects.create(address_key=address_key, owner=owner, expires_at=expires_at)
+        except IntegrityError:
+            taken_over = (
+                cls.objects
+                .filter(address_key=address_key, expires_at__lt=now)
+                .update(owner=owner, expires_at=expires_at)
+            )
+            return owner if taken_over else None
+        return owner
+
+    @classmethod
+    def release(cls, address_key, owner):
+        """Drop the lock unless it has expired and was taken over by someone else."""
+        cls.objects.filter(address_key=address_key, owner=owner).delete()
@@ -0,0 +1,60 @@
+import re
+
+
+STREET_TYPES = {
+    'улица': 'ул',
+    'ул': 'ул',
+    'проспект': 'пр-кт',
+    'просп': 'пр-кт',
+    'пр-т': 'пр-кт',
+    'пр-кт': 'пр-кт',
+    'переулок': 'пер',
+    'пер': 'пер',
+    'площадь': 'пл',
+    'пл': 'пл',
+    'шоссе': 'ш',
+    'ш': 'ш',
+    'бульвар': 'б-р',
+    'бул': 'б-р',
+    'б-р': 'б-р',
+    'набережная': 'наб',
+    'наб': 'наб',
+    'проезд': 'пр-д',
+    'пр-д': 'пр-д',
+    'тупик': 'туп',
+    'туп': 'туп',
+    'аллея': 'ал',
+    'ал': 'ал',
+    'микрорайон': 'мкр',
+    'мкр': 'мкр',
+}
+
+ABBREVIATIONS = {
+    'город': 'г',
+    'корпус': 'к',
+    'корп': 'к',
+    'строение': 'стр',
+    'квартира': 'кв',
+}
+
+HOUSE_MARKERS = {'дом', 'д'}
+
+PUNCTUATION_PATTERN = re.compile(r'[.,;:!?"\'«»()\[\]№#]+')
+
+
+def normalize_address(address):
+    """Canonical key of the address: "ул. Ленина, д. 1" and "Ленина улица 1" both give `ленина 1 ул`.
+
+    "д" is dropped as a house marker only before a number.
+    """
+    address = PUNCTUATION_PATTERN.sub(' ', address.casefold().replace('ё', 'е'))
+
+    words = []
+    street_types = []
+    address_words = address.split()
+    for word, next_word in zip(address_words, [*address_words[1:], '']):
+        if word in STREET_TYPES:
+            street_types.append(STREET_TYPES[word])
+        elif word not in HOUSE_MARKERS or not next_word[:1].isdigit():
+            words.append(ABBREVIATIONS.get(word, word))
+    return ' '.join([*words, *sorted(street_types)])
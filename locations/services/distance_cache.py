@@ -0,0 +1,112 @@
+import threading
+from collections import Counter
+
+from django.db.models import Q
+
+from locations.models import LocationDistance
+from locations.services.cache import LRUCache
+from locations.services.distances import get_pairwise_distances
+
+
+LRU_SIZE = 100_000
+
+
+def get_pair_key(from_location, to_location):
+    # Distances are symmetric, so both directions share one entry.
+    return tuple(sorted([from_location, to_location], key=lambda location: location.id))
+
+
+class DistanceCache:
+    """Distances between locations: process LRU keyed by coordinates, then the `LocationDistance` table."""
+
+    def __init__(self, maxsize=LRU_SIZE):
+        self._lru = LRUCache(maxsize)
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, **counters):
+        with self._stats_lock:
+            self._stats.update(counters)
+
+    @property
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        requests = sum(stats.values())
+        stats['hit_rate'] = (stats.get('lru_hits', 0) + stats.get('db_hits', 0)) / requests if requests else None
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def get_distances(self, location_pairs):
+        """Distances in km for `(from_location, to_location)` pairs, `None` where a location is missing."""
+        distances = [None] * len(location_pairs)
+        missing_pairs = {}
+        lru_hits = 0
+        for index, (from_location, to_location) in enumerate(location_pairs):
+            if from_location is None or to_location is None:
+                continue
+            from_location, to_location = get_pair_key(from_location, to_location)
+            lru_key = (from_location.latitude, from_location.longitude, to_location.latitude, to_location.longitude)
+            distance_between = self._lru.get(lru_key)
+            if distance_between is None:
+                missing_pairs.setdefault((from_location, to_location), []).append(index)
+            else:
+                distances[index] = distance_between
+                lru_hits += 1
+
+        stored_pairs = self._get_stored_distances(missing_pairs)
+        calculated_pairs = [pair for pair in missing_pairs if pair not in stored_pairs]
+        calculated_distances = get_pairwise_distances(
+            [(from_location.latitude, from_location.longitude) for from_location, _ in calculated_pairs],
+            [(to_location.latitude, to_location.longitude) for _, to_location in calculated_pairs],
+        )
+        LocationDistance.objects.bulk_create(
+            [
+                LocationDistance(from_location=from_location, to_location=to_location, distance=distance_between)
+                for (from_location, to_location), distance_between in zip(calculated_pairs, calculated_distances)
+            ],
+            ignore_conflicts=True,
+        )
+
+        for (from_location, to_location), distance_between in [
+            *stored_pairs.items(),
+            *zip(calculated_pairs, calculated_distances),
+        ]:
+            lru_key = (from_location.latitude, from_location.longitude, to_location.latitude, to_location.longitude)
+            self._lru.set(lru_key, distance_between)
+            for index in missing_pairs[(from_location, to_location)]:
+                distances[index] = distance_between
+
+        self._count(
+            lru_hits=lru_hits,
+            db_hits=sum(len(missing_pairs[pair]) for pair in stored_pairs),
+            misses=sum(len(missing_pairs[pair]) for pair in calculated_pairs),
+        )
+        return distances
+
+    def _get_stored_distances(self, location_pairs, batch_size=400):
+        location_pairs = list(location_pairs)
+        stored_distances = {}
+        for start in range(0, len(location_pairs), batch_size):
+            pairs_by_ids = {
+                (from_location.id, to_location.id): (from_location, to_location)
+                for from_location, to_location in location_pairs[start:start + batch_size]
+            }
+            rows = LocationDistance.objects.filter(
+                from_location_id__in={from_location_id for from_location_id, _ in pairs_by_ids},
+                to_location_id__in={to_location_id for _, to_location_id in pairs_by_ids},
+            ).values_list('from_location_id', 'to_location_id', 'distance')
+            for from_location_id, to_location_id, distance_between in rows:
+                location_pair = pairs_by_ids.get((from_location_id, to_location_id))
+                if location_pair is not None:
+                    stored_distances[location_pair] = distance_between
+        return stored_distances
+
+    def invalidate(self, location):
+        LocationDistance.objects.filter(Q(from_location=location) | Q(to_location=location)).delete()
+
+
+distance_cache = DistanceCache()
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _to_radians(coords):
+    known = np.array([point is not None for point in coords], dtype=bool)
+    points = np.array(
+        [point if point is not None else (0.0, 0.0) for point in coords],
+        dtype=float,
+    ).reshape(-1, 2)
+    return np.radians(points), known
+
+
+def _haversine(origin_lat, origin_lon, destination_lat, destination_lon):
+    haversine = (
+        np.sin((destination_lat - origin_lat) / 2) ** 2
+        + np.cos(origin_lat) * np.cos(destination_lat) * np.sin((destination_lon - origin_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(haversine, 0, 1)))
+
+
+def get_distance_matrix(origins, destinations):
+    """Haversine distances in km between every origin and destination, `nan` for unknown points."""
+    origins, known_origins = _to_radians(origins)
+    destinations, known_destinations = _to_radians(destinations)
+
+    origin_lat = origins[:, 0][:, np.newaxis]
+    origin_lon = origins[:, 1][:, np.newaxis]
+    destination_lat = destinations[:, 0][np.newaxis, :]
+    destination_lon = destinations[:, 1][np.newaxis, :]
+
+    matrix = _haversine(origin_lat, origin_lon, destination_lat, destination_lon)
+    matrix[~known_origins, :] = np.nan
+    matrix[:, ~known_destinations] = np.nan
+    return matrix
+
+
+def get_pairwise_distances(origins, destinations):
+    """Haversine distances in km between `origins[i]` and `destinations[i]`, `None` for unknown points."""
+    if not len(origins):
+        return []
+
+    origins, known_origins = _to_radians(origins)
+    destinations, known_destinations = _to_radians(destinations)
+    distances = _haversine(origins[:, 0], origins[:, 1], destinations[:, 0], destinations[:, 1])
+    return [
+        float(distance) if known else None
+        for distance, known in zip(distances, known_origins & known_destinations)
+    ]
+
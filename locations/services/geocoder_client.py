@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+CONNECT_TIMEOUT_SECONDS = 3.05
+READ_TIMEOUT_SECONDS = 10
+MAX_RETRIES = 2
+RETRY_DELAY_SECONDS = 0.2
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT_SECONDS = 30
+POOL_SIZE = 10
+
+
+class GeocoderUnavailable(requests.RequestException):
+    """The circuit breaker is open: the geocoder is not called at all."""
+
+
+class CircuitBreaker:
+    """Fails fast after `failure_threshold` failures in a row; lets a trial call through after `reset_timeout`."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_progress or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ClientMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.rejected = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+
+    def record(self, latency, failed):
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'error_rate': self.errors / self.requests if self.requests else None,
+                'avg_latency': self.total_latency / self.requests if self.requests else None,
+                'max_latency': self.max_latency,
+            }
+
+
+class GeocoderClient:
+    """HTTP client with a keep-alive connection pool, timeouts, retries and a circuit breaker."""
+
+    def __init__(self, max_retries=MAX_RETRIES, timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS),
+                 circuit_breaker=None, pool_size=POOL_SIZE):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.metrics = ClientMetrics()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @property
+    def max_duration(self):
+        """Worst-case seconds of `get_json`: every attempt times out after the longest backoff."""
+        timeouts = self.timeout if isinstance(self.timeout, tuple) else (self.timeout,)
+        backoff = sum(RETRY_DELAY_SECONDS * 2 ** attempt * 1.5 for attempt in range(self.max_retries))
+        return (self.max_retries + 1) * sum(timeouts) + backoff
+
+    def _request(self, url, params):
+        started_at = time.monotonic()
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            if response.status_code in RETRY_STATUS_CODES:
+                response.raise_for_status()
+        except requests.RequestException:
+            self.metrics.record(time.monotonic() - started_at, failed=True)
+            raise
+        self.metrics.record(time.monotonic() - started_at, failed=False)
+        return response
+
+    def get_json(self, url, params):
+        if not self.circuit_breaker.allow_request():
+            self.metrics.record_rejected()
+            raise GeocoderUnavailable('Геокодер временно недоступен')
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._request(url, params)
+                break
+            except requests.RequestException as error:
+                is_transient = isinstance(error, (requests.ConnectionError, requests.Timeout, requests.HTTPError))
+                if not is_transient or attempt == self.max_retries:
+                    self.circuit_breaker.record_failure()
+                    raise
+                time.sleep(RETRY_DELAY_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+
+        self.circuit_breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+
+geocoder_client = GeocoderClient()
@@ -0,0 +1,70 @@
+import math
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+MAX_PRECISION = 12
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude, longitude, precision=MAX_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bits_count = 0
+    is_lon_bit = True
+
+    while len(geohash) < precision:
+        value, value_range = (longitude, lon_range) if is_lon_bit else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        is_lon_bit = not is_lon_bit
+
+        bits_count += 1
+        if bits_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bits_count = 0
+
+    return ''.join(geohash)
+
+
+def get_cell_size(precision):
+    """Height and width of a cell in degrees."""
+    bits = precision * 5
+    lat_bits = bits // 2
+    lon_bits = bits - lat_bits
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def get_precision(latitude, radius_km):
+    """The longest precision whose cells are not smaller than the radius."""
+    max_latitude = min(abs(latitude) + radius_km / KM_PER_DEGREE, 89.9)
+    for precision in range(MAX_PRECISION, 0, -1):
+        lat_size, lon_size = get_cell_size(precision)
+        height_km = lat_size * KM_PER_DEGREE
+        width_km = lon_size * KM_PER_DEGREE * math.cos(math.radians(max_latitude))
+        if height_km >= radius_km and width_km >= radius_km:
+            return precision
+    return 0
+
+
+def get_covering_cells(latitude, longitude, radius_km):
+    """Geohash prefixes of cells covering a circle around the point, empty if it is too large."""
+    precision = get_precision(latitude, radius_km)
+    if not precision:
+        return set()
+
+    lat_size, lon_size = get_cell_size(precision)
+    cells = set()
+    for lat_shift in (-lat_size, 0, lat_size):
+        for lon_shift in (-lon_size, 0, lon_size):
+            cell_latitude = max(min(latitude + lat_shift, 90.0), -90.0)
+            cell_longitude = (longitude + lon_shift + 180) % 360 - 180
+            cells.add(encode(cell_latitude, cell_longitude, precision))
+    return cells
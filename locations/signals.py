@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Location
+from .services.distance_cache import distance_cache
+
+
+@receiver(pre_save, sender=Location)
+def remember_location_coordinates(sender, instance, **kwargs):
+    instance._previous_coordinates = None
+    if instance.pk:
+        instance._previous_coordinates = (
+            Location.objects
+            .filter(pk=instance.pk)
+            .values_list('latitude', 'longitude')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Location)
+def invalidate_distances_on_move(sender, instance, created, **kwargs):
+    previous_coordinates = getattr(instance, '_previous_coordinates', None)
+    if created or previous_coordinates is None:
+        return
+    if previous_coordinates != (float(instance.latitude), float(instance.longitude)):
+        distance_cache.invalidate(instance)
@@ -1,3 +1,447 @@
-from django.test import TestCase
+import math
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from geopy import distance
+from django.utils import timezone
+
+from locations.models import GeocodingJob, GeocodingLock, Location, LocationDistance, geocoder_cache
+from locations.services import geohash
+from locations.services.addresses import normalize_address
+from locations.services.distance_cache import DistanceCache
+from locations.services.distances import get_distance_matrix, get_pairwise_distances
+from locations.services.geocoder import ChainedGeocoder, OfflineGeocoder, build_geocoder
+from locations.services.geocoder_client import CircuitBreaker, GeocoderClient, GeocoderUnavailable, geocoder_client
+from locations.services.rate_limit import TokenBucket
+from locations.services.single_flight import SingleFlight
+
+
+class NearestLocationsTest(TestCase):
+    def setUp(self):
+        self.kremlin = Location.objects.create(address='Кремль', latitude=55.7520, longitude=37.6175)
+        self.arbat = Location.objects.create(address='Арбат', latitude=55.7494, longitude=37.5913)
+        self.khimki = Location.objects.create(address='Химки', latitude=55.8970, longitude=37.4297)
+        self.petersburg = Location.objects.create(address='Петербург', latitude=59.9386, longitude=30.3141)
+
+    def test_geohash_is_stored(self):
+        self.kremlin.refresh_from_db()
+        self.assertEqual(self.kremlin.geohash, geohash.encode(55.7520, 37.6175))
+        self.assertTrue(self.kremlin.geohash.startswith('ucfv0'))
+
+    def test_nearest_within_radius(self):
+        nearest = Location.objects.nearest((55.7539, 37.6208), max_km=30)
+
+        self.assertEqual([location for location, _ in nearest], [self.kremlin, self.arbat, self.khimki])
+        self.assertLess(nearest[0][1], 1)
+
+    def test_nearest_k(self):
+        nearest = Location.objects.nearest((59.93, 30.31), k=2)
+
+        self.assertEqual([location for location, _ in nearest], [self.petersburg, self.khimki])
+
+    def test_near_does_not_miss_locations_across_cell_borders(self):
+        for radius_km in (1, 5, 20, 100, 700):
+            for location in Location.objects.all():
+                point = (location.latitude + radius_km / 300, location.longitude - radius_km / 200)
+                self.assertIn(location, Location.objects.near([point], radius_km))
+
+
+class DistancesTest(SimpleTestCase):
+    kremlin = (55.7520, 37.6175)
+    khimki = (55.8970, 37.4297)
+    petersburg = (59.9386, 30.3141)
+
+    def assert_close_to_geopy(self, distance_km, origin, destination):
+        # Haversine takes the Earth for a sphere, geopy for an ellipsoid.
+        self.assertAlmostEqual(distance_km, distance.distance(origin, destination).km, delta=distance_km * 0.005)
+
+    def test_matrix_matches_geopy(self):
+        origins = [self.kremlin, self.khimki]
+        destinations = [self.petersburg, self.kremlin, self.khimki]
+
+        matrix = get_distance_matrix(origins, destinations)
+
+        self.assertEqual(matrix.shape, (2, 3))
+        self.assertEqual(matrix[0][1], 0)
+        for origin, row in zip(origins, matrix):
+            for destination, distance_km in zip(destinations, row):
+                if origin != destination:
+                    self.assert_close_to_geopy(distance_km, origin, destination)
+
+    def test_matrix_marks_unknown_points_with_nan(self):
+        matrix = get_distance_matrix([self.kremlin, None], [None, self.petersburg])
+
+        self.assertTrue(math.isnan(matrix[0][0]))
+        self.assertTrue(all(math.isnan(distance_km) for distance_km in matrix[1]))
+        self.assert_close_to_geopy(matrix[0][1], self.kremlin, self.petersburg)
+
+    def test_pairwise_distances(self):
+        distances = get_pairwise_distances(
+            [self.kremlin, self.khimki, None, self.kremlin],
+            [self.petersburg, self.kremlin, self.kremlin, None],
+        )
+
+        self.assert_close_to_geopy(distances[0], self.kremlin, self.petersburg)
+        self.assert_close_to_geopy(distances[1], self.khimki, self.kremlin)
+        self.assertEqual(distances[2:], [None, None])
+        self.assertEqual(get_pairwise_distances([], []), [])
+
+
+class DistanceCacheTest(TestCase):
+    def setUp(self):
+        self.kremlin = Location.objects.create(address='Кремль', latitude=55.7520, longitude=37.6175)
+        self.arbat = Location.objects.create(address='Арбат', latitude=55.7494, longitude=37.5913)
+
+    def test_distances_are_cached(self):
+        cache = DistanceCache()
+
+        [first_distance, missing_distance] = cache.get_distances([(self.kremlin, self.arbat), (self.kremlin, None)])
+        [second_distance] = cache.get_distances([(self.arbat, self.kremlin)])
+        [third_distance] = DistanceCache().get_distances([(self.kremlin, self.arbat)])
+
+        self.assertAlmostEqual(first_distance, 1.66, places=2)
+        self.assertIsNone(missing_distance)
+        self.assertEqual(first_distance, second_distance)
+        self.assertEqual(first_distance, third_distance)
+        self.assertEqual(cache.stats, {'lru_hits': 1, 'db_hits': 0, 'misses': 1, 'hit_rate': 0.5})
+        self.assertEqual(LocationDistance.objects.count(), 1)
+
+    def test_moved_location_drops_stored_distances(self):
+        cache = DistanceCache()
+        cache.get_distances([(self.kremlin, self.arbat)])
+
+        self.arbat.latitude = 55.8
+        self.arbat.save()
+        [distance_between] = cache.get_distances([(self.kremlin, self.arbat)])
+
+        self.assertGreater(distance_between, 5)
+        self.assertEqual(LocationDistance.objects.get().distance, distance_between)
+
+
+class NormalizeAddressTest(TestCase):
+    def test_variants_get_same_key(self):
+        variants = ['ул. Ленина 1', 'Ленина ул, 1', 'улица Ленина, д. 1 ', 'УЛ ЛЕНИНА  д.1']
+
+        self.assertEqual({normalize_address(address) for address in variants}, {'ленина 1 ул'})
+
+    def test_different_addresses_get_different_keys(self):
+        self.assertNotEqual(normalize_address('ул. Ленина 1'), normalize_address('пер. Ленина 1'))
+        self.assertNotEqual(normalize_address('ул. Ленина 1'), normalize_address('ул. Ленина 11'))
+        self.assertEqual(normalize_address('Пушкинская пл., строение 2'), normalize_address('пушкинская площадь стр 2'))
+
+    def test_village_is_not_taken_for_house_marker(self):
+        self.assertEqual(normalize_address('д. Ивановка, ул. Садовая, д. 5'), 'д ивановка садовая 5 ул')
+        self.assertNotEqual(normalize_address('д. Ивановка 5'), normalize_address('Ивановка 5'))
+        self.assertEqual(normalize_address('Ивановка, дом 5'), normalize_address('Ивановка 5'))
+
+
+@override_settings(GEOCODER_CACHE_TTL_SECONDS=3600, GEOCODER_NEGATIVE_CACHE_TTL_SECONDS=60)
+@mock.patch('locations.models.fetch_coordinates')
+class GeocoderCacheTest(TestCase):
+    def setUp(self):
+        geocoder_cache.clear()
+
+    def test_fresh_location_is_not_geocoded_again(self, fetch_coordinates):
+        fetch_coordinates.return_value = ('37.6175', '55.7520')
+
+        first_location = Location.create_location_by_address('Москва, Кремль')
+        second_location = Location.create_location_by_address('Москва, Кремль')
+
+        self.assertEqual(first_location, second_location)
+        self.assertEqual((second_location.latitude, second_location.longitude), (55.7520, 37.6175))
+        fetch_coordinates.assert_called_once()
+
+    def test_stale_location_is_refreshed(self, fetch_coordinates):
+        fetch_coordinates.return_value = ('37.6', '55.8')
+        stale_location = Location.objects.create(address='Москва, Кремль', latitude=55.7520, longitude=37.6175)
+        Location.objects.filter(pk=stale_location.pk).update(
+            last_request_to_geocoder=timezone.now() - timedelta(hours=2)
+        )
+
+        location = Location.create_location_by_address('Москва, Кремль')
+
+        self.assertEqual(location.pk, stale_location.pk)
+        self.assertEqual((location.latitude, location.longitude), (55.8, 37.6))
+        self.assertTrue(location.is_fresh())
+
+    def test_address_variants_share_location(self, fetch_coordinates):
+        fetch_coordinates.return_value = ('37.6175', '55.7520')
+
+        location = Location.create_location_by_address('ул. Ленина, д. 1')
+
+        self.assertEqual(Location.create_location_by_address('Ленина ул 1 '), location)
+        self.assertEqual(Location.get_location_or_none('ЛЕНИНА УЛИЦА, 1'), location)
+        self.assertEqual(Location.objects.by_addresses(['Ленина  улица 1']), {'Ленина  улица 1': location})
+        fetch_coordinates.assert_called_once()
+
+    def test_not_found_address_is_cached(self, fetch_coordinates):
+        fetch_coordinates.return_value = None
+
+        self.assertIsNone(Location.create_location_by_address('Нигде'))
+        self.assertIsNone(Location.create_location_by_address('Нигде'))
+        fetch_coordinates.assert_called_once()
+
+        geocoder_cache.set(normalize_address('Нигде'), (None, timezone.now() - timedelta(seconds=1)))
+        Location.create_location_by_address('Нигде')
+        self.assertEqual(fetch_coordinates.call_count, 2)
+
+
+class SingleFlightTest(TestCase):
+    def test_concurrent_calls_are_coalesced(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def geocode():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return ('37.6175', '55.7520')
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('кремль', geocode)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do('кремль', geocode)))
+            for _ in range(5)
+        ]
+        for follower in followers:
+            follower.start()
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [('37.6175', '55.7520')] * 6)
+
+    def test_error_is_shared_and_not_cached(self):
+        flight = SingleFlight()
+
+        with self.assertRaises(ValueError):
+            flight.do('кремль', mock.Mock(side_effect=ValueError))
+        self.assertEqual(flight.do('кремль', lambda: 'ok'), 'ok')
+
+
+@mock.patch('locations.models.fetch_coordinates')
+class GeocodingLockTest(TestCase):
+    def setUp(self):
+        geocoder_cache.clear()
+
+    def test_lock_is_exclusive_until_released_or_expired(self, fetch_coordinates):
+        owner = GeocodingLock.acquire('ленина 1 ул')
+        self.assertIsNotNone(owner)
+        self.assertIsNone(GeocodingLock.acquire('ленина 1 ул'))
+
+        GeocodingLock.release('ленина 1 ул', owner)
+        self.assertIsNotNone(GeocodingLock.acquire('ленина 1 ул'))
+
+        GeocodingLock.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNotNone(GeocodingLock.acquire('ленина 1 ул'))
+
+    def test_expired_owner_does_not_release_new_owner_lock(self, fetch_coordinates):
+        expired_owner = GeocodingLock.acquire('ленина 1 ул')
+        GeocodingLock.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        new_owner = GeocodingLock.acquire('ленина 1 ул')
+
+        GeocodingLock.release('ленина 1 ул', expired_owner)
+
+        self.assertNotEqual(expired_owner, new_owner)
+        self.assertIsNone(GeocodingLock.acquire('ленина 1 ул'))
+
+    def test_lease_outlives_geocoder_calls(self, fetch_coordinates):
+        self.assertGreater(GeocodingLock.LEASE_SECONDS, geocoder_client.max_duration)
+
+    @mock.patch('locations.models.time.sleep')
+    def test_waits_for_location_geocoded_by_other_process(self, sleep, fetch_coordinates):
+        GeocodingLock.acquire(normalize_address('ул. Ленина, 1'))
+        sleep.side_effect = lambda seconds: Location.objects.get_or_create(
+            address='ул. Ленина, 1',
+            defaults={'latitude': 55.7520, 'longitude': 37.6175},
+        )
+
+        location = Location.create_location_by_address('Ленина улица 1')
+
+        self.assertEqual(location.address, 'ул. Ленина, 1')
+        fetch_coordinates.assert_not_called()
+        self.assertIsNone(GeocodingLock.acquire(normalize_address('ул. Ленина, 1')))
+
+    def test_lock_is_released_after_geocoding(self, fetch_coordinates):
+        fetch_coordinates.side_effect = requests.ConnectionError('timeout')
+
+        with self.assertRaises(requests.ConnectionError):
+            Location.create_location_by_address('ул. Ленина, 1')
+
+        self.assertFalse(GeocodingLock.objects.exists())
+
+
+@mock.patch('locations.models.fetch_coordinates')
+class GeocodingJobTest(TestCase):
+    def setUp(self):
+        geocoder_cache.clear()
+
+    def run_worker(self):
+        call_command('geocode_worker', '--once', stdout=mock.Mock())
+
+    def test_unknown_address_is_geocoded_by_worker(self, fetch_coordinates):
+        fetch_coordinates.return_value = ('37.6175', '55.7520')
+
+        self.assertIsNone(Location.request_location_by_address('Москва, Кремль'))
+        fetch_coordinates.assert_not_called()
+        self.run_worker()
+
+        self.assertEqual(GeocodingJob.objects.get().status, GeocodingJob.DONE_STATUS)
+        self.assertEqual(Location.request_location_by_address('Москва, Кремль').latitude, 55.7520)
+        self.assertEqual(GeocodingJob.objects.get().status, GeocodingJob.DONE_STATUS)
+
+    def test_failed_job_is_retried_with_backoff(self, fetch_coordinates):
+        fetch_coordinates.side_effect = requests.ConnectionError('timeout')
+        Location.request_location_by_address('Москва, Кремль')
+
+        self.run_worker()
+        job = GeocodingJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (GeocodingJob.PENDING_STATUS, 1))
+        self.assertGreater(job.next_attempt_at, timezone.now() + timedelta(seconds=GeocodingJob.RETRY_DELAY_SECONDS - 1))
+
+        self.run_worker()
+        self.assertEqual(fetch_coordinates.call_count, 1)
+
+        GeocodingJob.objects.update(next_attempt_at=timezone.now())
+        fetch_coordinates.side_effect = None
+        fetch_coordinates.return_value = None
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), (GeocodingJob.FAILED_STATUS, 'Адрес не найден'))
+
+
+@mock.patch('locations.services.geocoder_client.time.sleep')
+class GeocoderClientTest(TestCase):
+    def get_client(self, responses):
+        client = GeocoderClient(max_retries=2, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        client.session.get = mock.Mock(side_effect=responses)
+        return client
+
+    def get_response(self, status_code, payload=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = b'{}' if payload is None else payload
+        return response
+
+    def test_transient_errors_are_retried(self, sleep):
+        client = self.get_client([
+            requests.ConnectionError(),
+            self.get_response(503),
+            self.get_response(200, b'{"found": true}'),
+        ])
+
+        self.assertEqual(client.get_json('https://geocoder', {}), {'found': True})
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(client.metrics.snapshot()['errors'], 2)
+        self.assertFalse(client.circuit_breaker.is_open)
+
+    def test_circuit_opens_after_failures(self, sleep):
+        client = self.get_client([requests.Timeout()] * 6)
+
+        for _ in range(2):
+            with self.assertRaises(requests.Timeout):
+                client.get_json('https://geocoder', {})
+        with self.assertRaises(GeocoderUnavailable):
+            client.get_json('https://geocoder', {})
+
+        self.assertTrue(client.circuit_breaker.is_open)
+        self.assertEqual(client.session.get.call_count, 6)
+        self.assertEqual(client.metrics.snapshot()['rejected'], 1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_burst_up_to_capacity(self):
+        bucket = TokenBucket(rate=2, capacity=3, clock=self.clock, sleep=self.clock.sleep)
+
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_acquire_blocks_until_refill(self):
+        bucket = TokenBucket(rate=4, capacity=1, clock=self.clock, sleep=self.clock.sleep)
+
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertEqual(self.clock.sleeps, [0.25, 0.25])
+        self.assertEqual(self.clock.now, 100.5)
+
+    def test_refill_is_capped_by_capacity(self):
+        bucket = TokenBucket(rate=2, capacity=2, clock=self.clock, sleep=self.clock.sleep)
+        bucket.acquire()
+        bucket.acquire()
+
+        self.clock.now += 0.5
+        bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+
+        self.clock.now += 60
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [0.5])
+
+
+class GeocoderBackendsTest(TestCase):
+    def test_offline_geocoder_reads_fixture(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8') as fixture:
+            fixture.write('address,longitude,latitude\nКрасная площадь,37.6208,55.7539\n')
+            fixture.flush()
+            geocoder = OfflineGeocoder(fixture.name, strict=True)
+
+        self.assertEqual(geocoder.fetch_coordinates('Красная площадь'), ('37.6208', '55.7539'))
+        self.assertIsNone(geocoder.fetch_coordinates('Арбат'))
+
+    def test_offline_geocoder_is_deterministic(self):
+        geocoder = OfflineGeocoder()
+
+        self.assertEqual(geocoder.fetch_coordinates('Арбат'), OfflineGeocoder().fetch_coordinates('Арбат'))
+        self.assertNotEqual(geocoder.fetch_coordinates('Арбат'), geocoder.fetch_coordinates('Кремль'))
+
+    def test_chain_falls_back_on_errors(self):
+        unavailable = mock.Mock()
+        unavailable.fetch_coordinates.side_effect = GeocoderUnavailable()
+        geocoder = ChainedGeocoder([unavailable, OfflineGeocoder()])
+
+        self.assertEqual(geocoder.fetch_coordinates('Арбат'), OfflineGeocoder().fetch_coordinates('Арбат'))
+
+        geocoder = ChainedGeocoder([unavailable])
+        with self.assertRaises(GeocoderUnavailable):
+            geocoder.fetch_coordinates('Арбат')
+
+    @override_settings(GEOCODER_FIXTURE=None)
+    def test_backend_is_built_from_settings(self):
+        geocoder = build_geocoder('yandex, offline')
+
+        self.assertIsInstance(geocoder, ChainedGeocoder)
+        self.assertEqual([type(backend).__name__ for backend in geocoder.geocoders], ['YandexGeocoder', 'OfflineGeocoder'])
+        self.assertTrue(geocoder.geocoders[1].strict)
+        self.assertFalse(build_geocoder('offline').strict)
+        with self.assertRaises(ValueError):
+            build_geocoder('google')
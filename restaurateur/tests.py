@@ -1,3 +1,296 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from foodcartapp.helpers import candidate_helpers
+from foodcartapp.helpers.candidate_helpers import refresh_order_candidates
+from foodcartapp.helpers.restaurant_helpers import menu_index
+from foodcartapp.models import Order, OrderItem, Product, Restaurant, RestaurantMenuItem
+from locations.models import Location
+from restaurateur.views import ORDERS_PAGE_SIZE
+
+
+class OrderListViewTest(TestCase):
+    def setUp(self):
+        menu_index.reset()
+        manager = get_user_model().objects.create_user('manager', password='password', is_staff=True)
+        self.client.force_login(manager)
+
+        self.restaurants = [
+            Restaurant.objects.create(name=f'Ресторан {number}', address=f'Ресторанная, {number}')
+            for number in range(3)
+        ]
+        self.products = [
+            Product.objects.create(name=f'Бургер {number}', price=100, image='burger.jpg')
+            for number in range(3)
+        ]
+        for restaurant in self.restaurants:
+            Location.objects.create(address=restaurant.address, latitude=55.75, longitude=37.61 + restaurant.id / 100)
+            for product in self.products:
+                RestaurantMenuItem.objects.create(restaurant=restaurant, product=product)
+
+    def create_orders(self, count, status=Order.PROCESS_STATUS):
+        for _ in range(count):
+            order = Order.objects.create(
+                firstname='Иван',
+                lastname='Иванов',
+                phonenumber='+79001234567',
+                address=f'Заказная, {Order.objects.count()}',
+                status=status,
+                processing_restaurant=None if status == Order.PROCESS_STATUS else self.restaurants[0],
+            )
+            Location.objects.create(address=order.address, latitude=55.7, longitude=37.6)
+            for product in self.products:
+                OrderItem.objects.create(order=order, product=product, product_price=product.price, quantity=2)
+            order.update_totals()
+            refresh_order_candidates(Order.objects.filter(pk=order.pk))
+
+    def get_orders_page(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('restaurateur:view_orders'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_depend_on_orders_count(self):
+        self.create_orders(2)
+        self.get_orders_page()
+        _, few_orders_queries = self.get_orders_page()
+
+        self.create_orders(20)
+        self.create_orders(5, status=Order.COOKING_STATUS)
+        response, many_orders_queries = self.get_orders_page()
+
+        self.assertEqual(len(response.context['orders_and_restaurants']), 27)
+        self.assertEqual(few_orders_queries, many_orders_queries)
+
+    def test_completed_orders_are_hidden(self):
+        self.create_orders(2)
+        self.create_orders(3, status=Order.COMPLETE_STATUS)
+
+        response, _ = self.get_orders_page()
+
+        statuses = [order.status for order, _ in response.context['orders_and_restaurants']]
+        self.assertEqual(statuses, [Order.PROCESS_STATUS, Order.PROCESS_STATUS])
+
+    def test_restaurants_are_sorted_by_distance(self):
+        self.create_orders(1)
+
+        response, _ = self.get_orders_page()
+
+        [(order, restaurants_and_distances)] = response.context['orders_and_restaurants']
+        self.assertEqual(
+            [restaurant for restaurant, _ in restaurants_and_distances],
+            self.restaurants,
+        )
+        self.assertEqual(order.total_price, 600)
+
+    def test_pages_are_walked_by_cursor(self):
+        self.create_orders(ORDERS_PAGE_SIZE + 5)
+        self.create_orders(3, status=Order.COOKING_STATUS)
+
+        first_page, _ = self.get_orders_page()
+        second_page, _ = self.get_orders_page(after=first_page.context['next_cursor'])
+        back_page, _ = self.get_orders_page(before=second_page.context['previous_cursor'])
+
+        first_ids = [order.id for order, _ in first_page.context['orders_and_restaurants']]
+        second_ids = [order.id for order, _ in second_page.context['orders_and_restaurants']]
+        self.assertEqual(len(first_ids), ORDERS_PAGE_SIZE)
+        self.assertEqual(len(second_ids), 8)
+        self.assertIsNone(second_page.context['next_cursor'])
+        self.assertEqual(first_ids + second_ids, list(
+            Order.objects.unfinished().order_by('status', 'created_at', 'id').values_list('id', flat=True)
+        ))
+        self.assertEqual([order.id for order, _ in back_page.context['orders_and_restaurants']], first_ids)
+        self.assertIsNone(back_page.context['previous_cursor'])
+
+    def test_orders_are_filtered(self):
+        self.create_orders(2)
+        self.create_orders(3, status=Order.COOKING_STATUS)
+        self.create_orders(1, status=Order.COMPLETE_STATUS)
+
+        cooking_page, _ = self.get_orders_page(status=Order.COOKING_STATUS, restaurant=self.restaurants[0].id)
+        complete_page, _ = self.get_orders_page(status=Order.COMPLETE_STATUS)
+        other_restaurant_page, _ = self.get_orders_page(restaurant=self.restaurants[1].id)
+
+        self.assertEqual(len(cooking_page.context['orders_and_restaurants']), 3)
+        self.assertEqual(len(complete_page.context['orders_and_restaurants']), 1)
+        self.assertEqual(len(other_restaurant_page.context['orders_and_restaurants']), 0)
+
+    def test_candidates_follow_menu_and_location_changes(self):
+        self.create_orders(1)
+        menu_item = RestaurantMenuItem.objects.get(restaurant=self.restaurants[0], product=self.products[0])
+
+        menu_item.availability = False
+        menu_item.save()
+        response, _ = self.get_orders_page()
+        [(_, restaurants_and_distances)] = response.context['orders_and_restaurants']
+        self.assertEqual([restaurant for restaurant, _ in restaurants_and_distances], self.restaurants[1:])
+
+        menu_item.availability = True
+        menu_item.save()
+        Location.objects.filter(address=self.restaurants[2].address).delete()
+        Location.objects.create(address=self.restaurants[2].address, latitude=55.7, longitude=37.6)
+        response, _ = self.get_orders_page()
+        [(_, restaurants_and_distances)] = response.context['orders_and_restaurants']
+        self.assertEqual(
+            [restaurant for restaurant, _ in restaurants_and_distances],
+            [self.restaurants[2], self.restaurants[0], self.restaurants[1]],
+        )
+        self.assertEqual(restaurants_and_distances[0][1], 0.0)
+
+    def get_candidate_ids(self, order):
+        return set(order.candidate_restaurants.values_list('restaurant_id', flat=True))
+
+    def test_order_candidates_do_not_depend_on_menu_index(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        menu_index.get_restaurant_ids([self.products[0].id])
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[1], product=self.products[0]).update(
+            availability=False,
+        )
+
+        refresh_order_candidates(Order.objects.filter(pk=order.pk))
+
+        self.assertTrue(menu_index.can_cook(self.restaurants[1].id, [self.products[0].id]))
+        self.assertEqual(self.get_candidate_ids(order), {self.restaurants[0].id, self.restaurants[2].id})
+
+    def test_menu_candidates_do_not_depend_on_menu_index(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        menu_index.get_restaurant_ids([self.products[0].id])
+        restaurant = Restaurant.objects.create(name='Новый ресторан', address='Ресторанная, 0')
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=restaurant, product=product) for product in self.products[1:]
+        ])
+        self.assertEqual(self.get_candidate_ids(order), {restaurant.id for restaurant in self.restaurants})
+
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.products[0])
+
+        self.assertFalse(menu_index.can_cook(restaurant.id, [self.products[1].id]))
+        self.assertEqual(
+            self.get_candidate_ids(order),
+            {restaurant.id, *(restaurant.id for restaurant in self.restaurants)},
+        )
+
+    def test_candidates_follow_location_delete(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+
+        Location.objects.filter(address=self.restaurants[0].address).delete()
+        self.assertEqual(self.get_candidate_ids(order), {self.restaurants[1].id, self.restaurants[2].id})
+
+        Location.objects.filter(address=order.address).delete()
+        self.assertEqual(
+            set(order.candidate_restaurants.values_list('restaurant_id', 'distance')),
+            {(restaurant.id, None) for restaurant in self.restaurants},
+        )
+
+    def create_order_at(self, address, latitude, longitude):
+        order = Order.objects.create(firstname='Иван', lastname='Иванов', phonenumber='+79001234567', address=address)
+        Location.objects.create(address=address, latitude=latitude, longitude=longitude)
+        OrderItem.objects.create(order=order, product=self.products[0], product_price=100)
+        refresh_order_candidates(Order.objects.filter(pk=order.pk))
+        return order
+
+    def test_restaurant_move_refreshes_nearby_orders_only(self):
+        self.create_orders(1)
+        moscow_order = Order.objects.get()
+        petersburg_order = self.create_order_at('Невский, 1', 59.93, 30.36)
+        kazan_order = self.create_order_at('Баумана, 1', 55.79, 49.12)
+        Location.objects.create(address='Невский, 2', latitude=59.93, longitude=30.35)
+        refresh_restaurant_candidates = candidate_helpers.refresh_restaurant_candidates
+        refreshed_order_ids = set()
+
+        def refresh_and_remember(restaurant_id, orders):
+            refreshed_order_ids.update(orders.values_list('id', flat=True))
+            refresh_restaurant_candidates(restaurant_id, orders)
+
+        restaurant = self.restaurants[0]
+        restaurant.address = 'Невский, 2'
+        with mock.patch.object(candidate_helpers, 'refresh_restaurant_candidates', refresh_and_remember):
+            restaurant.save()
+
+        self.assertEqual(refreshed_order_ids, {moscow_order.id, petersburg_order.id})
+        self.assertEqual(self.get_candidate_ids(moscow_order), {self.restaurants[1].id, self.restaurants[2].id})
+        self.assertEqual(self.get_candidate_ids(petersburg_order), {restaurant.id})
+        self.assertEqual(self.get_candidate_ids(kazan_order), set())
+
+    def test_location_change_finds_orders_by_address_key(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+
+        Location.objects.filter(address=order.address).delete()
+        Location.objects.create(address='заказная д. 0', latitude=59.94, longitude=30.31)
+
+        self.assertEqual(order.address_key, 'заказная 0')
+        self.assertFalse(order.candidate_restaurants.exists())
+
+    def get_feed_events(self, **headers_and_params):
+        response = self.client.get(reverse('restaurateur:view_orders_feed'), **headers_and_params)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'retry: 5000')
+        event_ids = [line[len('id: '):] for line in lines if line.startswith('id: ')]
+        events = [json.loads(line[len('data: '):]) for line in lines if line.startswith('data: ')]
+        return events, event_ids
+
+    def test_feed_streams_changed_orders(self):
+        self.create_orders(2)
+        first_order, second_order = Order.objects.order_by('id')
+        response, _ = self.get_orders_page()
+        feed_cursor = response.context['feed_cursor']
+
+        second_order.processing_restaurant = self.restaurants[1]
+        second_order.status = Order.COOKING_STATUS
+        second_order.save()
+        self.create_orders(1)
+        events, event_ids = self.get_feed_events(data={'since': feed_cursor})
+
+        self.assertEqual([event['id'] for event in events], [second_order.id, second_order.id + 1])
+        self.assertNotIn(f'order-{first_order.id}"', ''.join(event['html'] for event in events))
+        self.assertIn(self.restaurants[1].name, events[0]['html'])
+        self.assertTrue(all(event['visible'] for event in events))
+        self.assertEqual(self.get_feed_events(HTTP_LAST_EVENT_ID=event_ids[-1]), ([], []))
+
+    def test_feed_of_empty_board_streams_orders_created_after_render(self):
+        response, _ = self.get_orders_page()
+        self.assertEqual(response.context['orders_and_restaurants'], [])
+        self.assertIn('since=start', response.content.decode())
+
+        self.create_orders(2)
+        events, _ = self.get_feed_events(data={'since': response.context['feed_cursor']})
+
+        order_ids = list(Order.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual([event['id'] for event in events], order_ids)
+
+    def test_rows_carry_board_sort_key(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+
+        response, _ = self.get_orders_page()
+
+        created_at = order.created_at
+        sort_key = f'{order.status},{int(created_at.timestamp())},{created_at.microsecond:06d},{order.id}'
+        self.assertContains(response, f'data-sort-key="{sort_key}"')
+        self.assertContains(response, f'data-page-size="{ORDERS_PAGE_SIZE}"')
+
+    def test_feed_catches_orders_committed_out_of_order(self):
+        self.create_orders(2)
+        last_order = Order.objects.latest('id')
+        response, _ = self.get_orders_page()
+        feed_cursor = response.context['feed_cursor']
+        self.assertEqual(self.get_feed_events(HTTP_LAST_EVENT_ID=feed_cursor), ([], []))
+
+        self.create_orders(1)
+        late_order = Order.objects.latest('id')
+        Order.objects.filter(pk=late_order.pk).update(updated_at=last_order.updated_at - timedelta(seconds=1))
+        events, event_ids = self.get_feed_events(HTTP_LAST_EVENT_ID=feed_cursor)
+
+        self.assertEqual([event['id'] for event in events], [late_order.id])
+        self.assertEqual(self.get_feed_events(HTTP_LAST_EVENT_ID=event_ids[-1]), ([], []))
@@ -1,16 +1,32 @@
+import json
+from datetime import datetime, time, timedelta
+
 from django import forms
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.views import View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
-
-from foodcartapp.helpers.order_helpers import get_orders_with_available_restaurants
+from django.utils import timezone
+
+from foodcartapp.helpers.order_feed import get_feed_cursor, get_order_changes
+from foodcartapp.helpers.order_helpers import (
+    get_order_board_queryset,
+    get_orders_with_available_restaurants,
+    paginate_orders,
+)
 from foodcartapp.models import Order, Product, Restaurant
 
 
+ORDERS_PAGE_SIZE = 50
+ORDER_FEED_BATCH_SIZE = 100
+
+
 class Login(forms.Form):
     username = forms.CharField(
         label='Логин', max_length=75, required=True,
@@ -28,6 +44,58 @@ class Login(forms.Form):
     )
 
 
+class OrderFilterForm(forms.Form):
+    status = forms.TypedChoiceField(
+        label='Статус',
+        choices=[('', 'Все незавершённые'), *Order.STATUS_CHOICES],
+        coerce=int,
+        empty_value=None,
+        required=False,
+    )
+    restaurant = forms.ModelChoiceField(
+        label='Ресторан',
+        queryset=Restaurant.objects.order_by('name'),
+        empty_label='Все рестораны',
+        required=False,
+    )
+    payment_type = forms.ChoiceField(
+        label='Способ оплаты',
+        choices=[('', 'Любой'), *Order.PAYMENT_TYPES],
+        required=False,
+    )
+    created_from = forms.DateField(
+        label='Создан с',
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        required=False,
+    )
+    created_to = forms.DateField(
+        label='Создан по',
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        required=False,
+    )
+
+    def filter_orders(self, orders):
+        filters = self.cleaned_data
+
+        if filters['status'] is None:
+            orders = orders.unfinished()
+        else:
+            orders = orders.filter(status=filters['status'])
+        if filters['restaurant']:
+            orders = orders.filter(processing_restaurant=filters['restaurant'])
+        if filters['payment_type']:
+            orders = orders.filter(payment_type=filters['payment_type'])
+        if filters['created_from']:
+            orders = orders.filter(
+                created_at__gte=timezone.make_aware(datetime.combine(filters['created_from'], time.min))
+            )
+        if filters['created_to']:
+            orders = orders.filter(
+                created_at__lt=timezone.make_aware(datetime.combine(filters['created_to'] + timedelta(days=1), time.min))
+            )
+        return orders
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -92,9 +160,74 @@ def view_restaurants(request):
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    orders_with_restaurants_and_locations = get_orders_with_available_restaurants()
+    filter_form = OrderFilterForm(request.GET)
+    orders = get_order_board_queryset()
+    orders = filter_form.filter_orders(orders) if filter_form.is_valid() else orders.unfinished()
+
+    orders_page = paginate_orders(
+        orders,
+        ORDERS_PAGE_SIZE,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    orders_with_restaurants_and_locations = get_orders_with_available_restaurants(orders_page.orders)
 
     return render(request, template_name='order_list.html', context={
         'orders_and_restaurants': orders_with_restaurants_and_locations,
         'process_status': Order.PROCESS_STATUS,
+        'board_url': request.build_absolute_uri(),
+        'filter_form': filter_form,
+        'filter_query': get_filter_query(request),
+        'next_cursor': orders_page.next_cursor,
+        'previous_cursor': orders_page.previous_cursor,
+        'feed_cursor': get_feed_cursor(),
+        'page_size': ORDERS_PAGE_SIZE,
     })
+
+
+def get_filter_query(request):
+    filter_params = request.GET.copy()
+    for param in ('after', 'before', 'since'):
+        filter_params.pop(param, None)
+    return filter_params.urlencode()
+
+
+def format_order_changes(request, filter_form, changes):
+    orders = [order for order, _ in changes]
+    visible_order_ids = set()
+    if filter_form.is_valid():
+        visible_order_ids = set(
+            filter_form.filter_orders(Order.objects.filter(id__in=[order.id for order in orders]))
+            .values_list('id', flat=True)
+        )
+
+    board_url = request.build_absolute_uri(
+        f"{reverse('restaurateur:view_orders')}?{get_filter_query(request)}"
+    )
+    cursors = [cursor for _, cursor in changes]
+    for (order, restaurants), cursor in zip(get_orders_with_available_restaurants(orders), cursors):
+        html = render_to_string('order_row.html', request=request, context={
+            'order': order,
+            'restaurants': restaurants,
+            'process_status': Order.PROCESS_STATUS,
+            'board_url': board_url,
+        })
+        data = json.dumps({'id': order.id, 'visible': order.id in visible_order_ids, 'html': html})
+        yield f'id: {cursor}\nevent: order\ndata: {data}\n\n'
+
+
+def stream_order_changes(request, cursor):
+    """Server-sent events with the orders changed after the cursor; the browser reconnects to poll."""
+    filter_form = OrderFilterForm(request.GET)
+    yield f'retry: {int(settings.ORDER_FEED_POLL_SECONDS * 1000)}\n\n'
+    changes = get_order_changes(get_order_board_queryset(), cursor, ORDER_FEED_BATCH_SIZE)
+    yield from format_order_changes(request, filter_form, changes)
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders_feed(request):
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('since') or get_feed_cursor()
+    response = StreamingHttpResponse(stream_order_changes(request, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
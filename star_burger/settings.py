@@ -10,7 +10,16 @@ env.read_env()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-YANDEX_GEOCODE_KEY = env('YANDEX_KEY')
+YANDEX_GEOCODE_KEY = env('YANDEX_KEY', '')
+GEOCODER_BACKEND = env('GEOCODER_BACKEND', 'yandex')
+GEOCODER_FIXTURE = env('GEOCODER_FIXTURE', None)
+GEOCODER_CACHE_TTL_SECONDS = env.int('GEOCODER_CACHE_TTL_SECONDS', 30 * 24 * 60 * 60)
+GEOCODER_NEGATIVE_CACHE_TTL_SECONDS = env.int('GEOCODER_NEGATIVE_CACHE_TTL_SECONDS', 60 * 60)
+DELIVERY_RADIUS_KM = env.float('DELIVERY_RADIUS_KM', 50)
+RESTAURANT_ORDERS_CAPACITY = env.int('RESTAURANT_ORDERS_CAPACITY', None)
+ORDER_FEED_POLL_SECONDS = env.float('ORDER_FEED_POLL_SECONDS', 5)
+ORDER_FEED_OVERLAP_SECONDS = env.float('ORDER_FEED_OVERLAP_SECONDS', 30)
+IDEMPOTENCY_KEY_TTL_SECONDS = env.int('IDEMPOTENCY_KEY_TTL_SECONDS', 24 * 60 * 60)
 
 SECRET_KEY = env('SECRET_KEY')
 DEBUG = env.bool('DEBUG', True)
@@ -92,6 +101,10 @@ DATABASES = {
     )
 }
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'db://star_burger_cache'),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',